@@ -0,0 +1,72 @@
+"""Cold-start time of the API: process start to /healthz and to /readyz.
+
+Starts the server command from chatbot/ (gunicorn with the repo's config by
+default) and polls the probes until both answer 200. The /readyz body has the
+worker's own import and warm-up times. Requires MongoURI and GEMINI_API_KEY
+in the environment, like the app itself.
+
+    python benchmarks/bench_cold_start.py --runs 3
+    python benchmarks/bench_cold_start.py --command "uvicorn main:app --port 7861" --port 7861
+"""
+import argparse
+import json
+import os
+import shlex
+import signal
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+CHATBOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chatbot")
+
+
+def probe(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError:
+        return None, b""
+
+
+def cold_start(command: str, port: int, timeout: float) -> dict:
+    start = time.perf_counter()
+    process = subprocess.Popen(shlex.split(command), cwd=CHATBOT_DIR, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"healthy_s": None, "ready_s": None, "worker": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            if result["healthy_s"] is None and probe(f"http://127.0.0.1:{port}/healthz")[0] == 200:
+                result["healthy_s"] = round(time.perf_counter() - start, 2)
+            if result["healthy_s"] is not None:
+                code, body = probe(f"http://127.0.0.1:{port}/readyz")
+                if code == 200:
+                    result["ready_s"] = round(time.perf_counter() - start, 2)
+                    result["worker"] = json.loads(body)
+                    break
+            time.sleep(0.05)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--command", default="gunicorn -c gunicorn.conf.py -w 4 -k uvicorn.workers.UvicornWorker main:app --bind 127.0.0.1:7860")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=180)
+    args = parser.parse_args()
+
+    for run in range(args.runs):
+        result = cold_start(args.command, args.port, args.timeout)
+        worker = result["worker"] or {}
+        print(f"run {run + 1}: healthy {result['healthy_s']}s, ready {result['ready_s']}s "
+              f"(worker import {worker.get('import_seconds')}s, warm-up {worker.get('warm_up_seconds')}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Requests/second per worker for the blocking vs. async data path.
+
+Runs N concurrent requests on one event loop (one uvicorn worker) against a
+fake Gemini model and a local Mongo stand-in, comparing the old shape
+(blocking embed_query / aggregate / invoke inside async handlers) with the
+thread-pool offloaded path in tool.py. Every request asks a distinct
+question and the embedding and search caches are emptied before each run,
+so both paths do the full encode and search work.
+
+    python benchmarks/bench_event_loop.py --requests 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chatbot"))
+
+import tool  # noqa: E402
+
+EMBED_SECONDS = 0.004   # CPU time of one MiniLM query encode
+MONGO_SECONDS = 0.030   # Atlas $vectorSearch round-trip
+LLM_SECONDS = 0.200     # one Gemini call
+
+
+class FakeEmbeddings:
+    """Burns CPU for EMBED_SECONDS and returns a deterministic 384-dim vector."""
+
+    def embed_query(self, text):
+        deadline = time.perf_counter() + EMBED_SECONDS
+        digest = hashlib.sha256(text.encode()).digest()
+        while time.perf_counter() < deadline:
+            digest = hashlib.sha256(digest).digest()
+        return [b / 255.0 for b in (digest * 12)[:384]]
+
+
+class FakeCollection:
+    """Blocking pymongo-like collection whose aggregate waits like a network call."""
+
+    name = "properties"
+
+    def aggregate(self, pipeline):
+        time.sleep(MONGO_SECONDS)
+        return iter([{"_id": i, "title": f"Apartment {i}", "description": "Bole", "score": 0.9} for i in range(6)])
+
+
+class FakeGemini:
+    def invoke(self, messages):
+        time.sleep(LLM_SECONDS)
+        return "answer"
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(LLM_SECONDS)
+        return "answer"
+
+
+collection = FakeCollection()
+model = FakeGemini()
+
+
+async def blocking_properties(query):
+    query_embedding = tool.embedmodel.embed_query(query)
+    return list(collection.aggregate([{"queryVector": query_embedding}]))
+
+
+async def blocking_chatbot(query):
+    model.invoke([query])
+    await blocking_properties(query)
+    return model.invoke([query])
+
+
+async def async_properties(query):
+    return await tool.get_properties_by_context(query, collection)
+
+
+async def async_chatbot(query):
+    await model.ainvoke([query])
+    await tool.properties_vector_search.ainvoke({"query": query, "properties_collection": collection})
+    return await model.ainvoke([query])
+
+
+async def drive(handler, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    tool.embedding_cache.clear()
+    tool.search_coalescer.invalidate()
+    run = f"{handler.__name__} {time.perf_counter_ns()}"
+
+    async def one(i):
+        async with semaphore:
+            await handler(f"apartments in Bole {run} {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    logging.getLogger("tool").setLevel(logging.WARNING)
+    tool.embedmodel = FakeEmbeddings()
+    cases = [
+        ("/properties-by-context", blocking_properties, async_properties),
+        ("/chatbot", blocking_chatbot, async_chatbot),
+    ]
+    print(f"{'endpoint':<24}{'blocking req/s':>16}{'async req/s':>14}{'speedup':>10}")
+    for name, before, after in cases:
+        requests = args.requests if name != "/chatbot" else max(args.requests // 4, 1)
+        before_rps = asyncio.run(drive(before, requests, args.concurrency))
+        after_rps = asyncio.run(drive(after, requests, args.concurrency))
+        print(f"{name:<24}{before_rps:>16.1f}{after_rps:>14.1f}{after_rps / before_rps:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Serialization cost of property search results: old path vs. codec + orjson.
+
+Decodes realistic property documents from BSON (as a cursor batch would) and
+serializes them the way the tools and /properties-by-context do:
+
+- tool result: old = default decode, convert_to_serializable, json.dumps;
+  new = JSON_CODEC_OPTIONS decode, serialization.dumps
+- API response: old = default decode, str() of the id fields, FastAPI's
+  jsonable_encoder and JSONResponse; new = JSON_CODEC_OPTIONS decode and
+  serialization.JSONResponse
+
+    python benchmarks/bench_serialization.py --docs 6 --repeat 2000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import timeit
+
+import bson
+from bson import ObjectId
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "chatbot"))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse as FastAPIJSONResponse  # noqa: E402
+from load_test import synthetic_catalog  # noqa: E402
+from serialization import JSON_CODEC_OPTIONS, JSONResponse, convert_to_serializable, dumps  # noqa: E402
+
+
+def property_documents(count: int) -> bytes:
+    """BSON of property search hits: every field but the vectors, plus ids, dates and the score."""
+    rng = random.Random(0)
+    properties, _, _ = synthetic_catalog(count, 1)
+    data = b""
+    for doc in properties:
+        created = datetime.datetime(2025, rng.randint(1, 12), rng.randint(1, 28), 10, 30)
+        doc.update({
+            "_id": ObjectId(), "companyId": ObjectId(), "userId": ObjectId(), "purchaseId": ObjectId(),
+            "createdAt": created, "updatedAt": created, "score": rng.random(),
+            "location": {"type": "Point", "coordinates": [38.7 + rng.random() / 10, 9.0 + rng.random() / 10]},
+            "panoramicImages": [{"url": f"https://example.com/p/{n}.jpg", "uploadedBy": ObjectId()} for n in range(3)],
+        })
+        data += bson.encode(doc)
+    return data
+
+
+def old_tool_result(data: bytes) -> str:
+    return json.dumps([{"content": d["description"], "metadata": convert_to_serializable(d)} for d in bson.decode_all(data)])
+
+
+def new_tool_result(data: bytes) -> str:
+    return dumps([{"content": d["description"], "metadata": d} for d in bson.decode_all(data, JSON_CODEC_OPTIONS)])
+
+
+def old_response(data: bytes) -> bytes:
+    results = bson.decode_all(data)
+    for result in results:
+        for field in ("_id", "companyId", "userId", "purchaseId"):
+            if field in result:
+                result[field] = str(result[field])
+    # Nested ObjectIds are not converted by the old path; jsonable_encoder needs them as str
+    content = jsonable_encoder({"properties": results}, custom_encoder={ObjectId: str})
+    return FastAPIJSONResponse(content).body
+
+
+def new_response(data: bytes) -> bytes:
+    return JSONResponse({"properties": bson.decode_all(data, JSON_CODEC_OPTIONS)}).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=6, help="documents per result (6 for /properties-by-context, 10 for the tool)")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    data = property_documents(args.docs)
+    assert json.loads(old_tool_result(data))[0]["metadata"]["_id"] == json.loads(new_tool_result(data))[0]["metadata"]["_id"]
+    print(f"{args.docs} documents, {len(data) / 1024:.1f} KiB of BSON")
+    for name, old, new in [("tool result", old_tool_result, new_tool_result), ("API response", old_response, new_response)]:
+        old_us = min(timeit.repeat(lambda: old(data), number=args.repeat, repeat=3)) / args.repeat * 1e6
+        new_us = min(timeit.repeat(lambda: new(data), number=args.repeat, repeat=3)) / args.repeat * 1e6
+        print(f"{name:<14} old {old_us:8.1f} us   new {new_us:8.1f} us   {old_us / new_us:4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
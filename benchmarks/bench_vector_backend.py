@@ -0,0 +1,99 @@
+"""Recall and latency of the local vector backend's IVF index vs. brute force.
+
+Builds a synthetic clustered catalog of 384-dim unit vectors (the shape of
+the all-MiniLM-L6-v2 ``revoemb`` field), with queries drawn around the same
+cluster centers so that, as with real searches, each query has close
+neighbours in the catalog. The catalog is stored as a memory-mapped .npy
+file in float32 and float16, and recall@k against exact search plus
+per-query latency is reported for several ``nprobe`` values. Then does the same for
+int8 and binary quantized vectors held in memory, with candidates
+oversampled and rescored against the float32 memory map. The rescored
+pool here is ``k`` times the oversampling factor; the backend rescores
+``numCandidates`` times it, so its recall is at least as high.
+
+    python benchmarks/bench_vector_backend.py --vectors 50000 --queries 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chatbot"))
+
+from vector_backend import DEFAULT_OVERSAMPLE, QUANTIZATIONS, IVFIndex, QuantizedVectors, brute_force_search, rescore  # noqa: E402
+
+DIMENSIONS = 384
+
+
+def synthetic_vectors(n: int, centers: np.ndarray, rng) -> np.ndarray:
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def timed(search, queries, k):
+    results, start = [], time.perf_counter()
+    for query in queries:
+        rows, _ = search(query, k)
+        results.append(set(rows[:k].tolist()))
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, help="quantized candidates rescored per result (default: the backend's)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, DIMENSIONS)).astype(np.float32)
+    data = synthetic_vectors(args.vectors, centers, rng)
+    queries = synthetic_vectors(args.queries, centers, rng)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(data)
+    print(f"{args.vectors} vectors, nlist={len(index.centroids)}, build {time.perf_counter() - start:.1f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for dtype in (np.float32, np.float16):
+            path = os.path.join(directory, f"vectors-{np.dtype(dtype).name}.npy")
+            np.save(path, data.astype(dtype))
+            vectors = np.load(path, mmap_mode="r")
+            print(f"\n{np.dtype(dtype).name} memmap ({os.path.getsize(path) / 2**20:.0f} MiB)")
+
+            exact, exact_ms = timed(lambda q, k: brute_force_search(vectors, q, k), queries, args.k)
+            print(f"  {'brute force':<24} recall@{args.k} 1.000  {exact_ms:7.2f} ms/query")
+            for nprobe in (1, 4, 8, 16, 32):
+                ivf = IVFIndex(vectors, index.centroids, index.order, index.offsets, nprobe=nprobe)
+                found, ms = timed(lambda q, k: ivf.search(q, k), queries, args.k)
+                recall = np.mean([len(f & e) / args.k for f, e in zip(found, exact)])
+                print(f"  {'ivf nprobe=' + str(nprobe):<24} recall@{args.k} {recall:.3f}  {ms:7.2f} ms/query")
+
+        # Float vectors for rescoring stay memory-mapped; only the codes are in memory
+        path = os.path.join(directory, "vectors-float32.npy")
+        vectors = np.load(path, mmap_mode="r")
+        exact, _ = timed(lambda q, k: brute_force_search(vectors, q, k), queries, args.k)
+        for kind in QUANTIZATIONS:
+            codes = QuantizedVectors.quantize(data, kind)
+            oversample = args.oversample or DEFAULT_OVERSAMPLE[kind]
+            print(f"\n{kind} in memory ({codes.codes.nbytes / 2**20:.1f} MiB), rescoring {oversample}x candidates")
+
+            def quantized(search):
+                return lambda q, k: rescore(vectors, search(q, k * oversample)[0], q, k)
+
+            for name, search in [("brute force", lambda q, n: brute_force_search(codes, q, n)),
+                                 *((f"ivf nprobe={nprobe}", IVFIndex(codes, index.centroids, index.order, index.offsets, nprobe=nprobe).search)
+                                   for nprobe in (8, 16, 32))]:
+                for label, run in [("", lambda q, k: search(q, k)), (" +rescore", quantized(search))]:
+                    found, ms = timed(run, queries, args.k)
+                    recall = np.mean([len(f & e) / args.k for f, e in zip(found, exact)])
+                    print(f"  {name + label:<24} recall@{args.k} {recall:.3f}  {ms:7.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
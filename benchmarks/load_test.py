@@ -0,0 +1,400 @@
+"""Offline load test of main:app with stand-in Gemini, Mongo and vector search.
+
+Drives /chatbot and /properties-by-context in-process through the real
+FastAPI app, routes, LangGraph agent, tools, caches and serialization.
+Only the external services are replaced:
+
+- Gemini: a scripted model that sleeps like a real call and emits the tool
+  calls Gemini would (properties, companies or Revoestate by query intent),
+  then an answer once tool results are in.
+- MongoDB: mongomock, seeded with a synthetic Addis Ababa catalog
+  (properties, companies and revoinformation with ``revoemb`` vectors).
+- Vector search: an exact search over the seeded vectors behind the
+  vector_backend interface, applying the same filters and projection stages.
+- Embeddings: a deterministic bag-of-words 384-dim embedding that costs
+  about as much CPU as a MiniLM query encode (``--real-embeddings`` uses the
+  model instead).
+
+Reports throughput, p50/p95/p99 latency, errors, requests shed with 429
+and worker memory (RSS) per endpoint and concurrency level. Caches are cleared before each level; how
+often queries repeat within a level follows from ``--distinct-queries``. Save results with ``--json`` and compare
+runs before and after a change.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load_test.py --concurrency 1,8,32 --requests 200
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+import uuid
+
+import numpy as np
+
+CHATBOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "chatbot")
+sys.path.insert(0, CHATBOT_DIR)
+
+SUBCITIES = ["Bole", "Yeka", "Kirkos", "Arada", "Lideta", "Gullele", "Kolfe Keranio", "Lemi Kura", "Akaky Kaliti", "Nifas Silk-Lafto"]
+PROPERTY_TYPES = ["apartment", "villa", "condominium", "house", "office", "land"]
+AMENITIES = ["parking", "garden", "security", "elevator", "generator", "water tank", "gym", "balcony"]
+COMPANY_WORDS = ["Noah", "Ayat", "Gift", "Sunshine", "Flintstone", "Tsehay", "Temer", "Zemen", "Abyssinia", "Metropolitan"]
+
+
+class BagOfWordsEmbeddings:
+    """Deterministic 384-dim embedding; similar texts share words and so get similar vectors."""
+
+    def __init__(self, cpu_seconds: float = 0.004):
+        self.cpu_seconds = cpu_seconds
+
+    def _embed(self, text: str):
+        deadline = time.perf_counter() + self.cpu_seconds
+        vector = np.zeros(384, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 384] += 1
+        while time.perf_counter() < deadline:
+            pass
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+
+def synthetic_catalog(properties: int, companies: int, seed: int = 0):
+    rng = random.Random(seed)
+    company_docs = []
+    for i in range(companies):
+        name = f"{COMPANY_WORDS[i % len(COMPANY_WORDS)]} Real Estate {i // len(COMPANY_WORDS) or ''}".strip()
+        company_docs.append({
+            "realEstateName": name,
+            "description": f"{name} develops and sells apartments and villas in {rng.choice(SUBCITIES)}. " * 3,
+            "phone": f"+2519{rng.randint(10000000, 99999999)}",
+            "email": f"info@{name.split()[0].lower()}.et",
+            "address": {"region": "Addis Ababa", "city": rng.choice(SUBCITIES), "specificLocation": f"Street {i}"},
+            "isVerified": rng.random() < 0.7,
+        })
+    property_docs = []
+    for i in range(properties):
+        kind = rng.choice(PROPERTY_TYPES)
+        subcity = rng.choice(SUBCITIES)
+        bedrooms = rng.randint(1, 6)
+        listing = rng.choice(["rent", "sale"])
+        price = rng.randint(8, 150) * 1000 if listing == "rent" else rng.randint(2, 60) * 500000
+        amenities = rng.sample(AMENITIES, rng.randint(1, 4))
+        property_docs.append({
+            "title": f"{bedrooms} bedroom {kind} in {subcity}",
+            "description": f"Spacious {kind} for {listing} in {subcity}, Addis Ababa with {', '.join(amenities)}. " * 6,
+            "price": price, "currency": "ETB", "listingType": listing, "propertyType": kind,
+            "bedrooms": bedrooms, "bathrooms": max(1, bedrooms - 1), "area": bedrooms * 45 + rng.randint(0, 60),
+            "amenities": amenities, "furnished": rng.random() < 0.4, "status": "available",
+            "address": {"region": "Addis Ababa", "city": subcity, "specificLocation": f"Block {i % 97}"},
+            "images": [f"https://example.com/{i}/{n}.jpg" for n in range(5)],
+        })
+    revo_docs = [
+        {"text": f"Revoestate is a real estate platform in Ethiopia. Section {i}: listing properties, company profiles, "
+                 f"searching for homes, contact and support information."}
+        for i in range(60)
+    ]
+    return property_docs, company_docs, revo_docs
+
+
+def query_pool(distinct: int, seed: int = 1):
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(distinct):
+        roll = rng.random()
+        if roll < 0.7:
+            listing = rng.choice(["for rent", "for sale"])
+            budget = f" under {rng.randint(20, 120)}k birr" if listing == "for rent" and rng.random() < 0.5 else ""
+            pool.append(f"{rng.randint(1, 5)} bedroom {rng.choice(PROPERTY_TYPES)} {listing} in {rng.choice(SUBCITIES)}{budget}")
+        elif roll < 0.85:
+            pool.append(f"Tell me about {rng.choice(COMPANY_WORDS)} Real Estate")
+        else:
+            pool.append(rng.choice(["What is Revoestate?", "How do I list my property on Revoestate?", "How do I contact Revoestate?"]))
+    return pool
+
+
+class ScriptedGemini:
+    """Stand-in for the tool-bound Gemini model used by the agent.
+
+    With a ``capacity``, calls beyond that many in flight slow down in
+    proportion, like a rate-limited API sharing its throughput.
+    """
+
+    def __init__(self, latency: float, answer_latency: float, capacity: int = 0):
+        self.latency = latency
+        self.answer_latency = answer_latency
+        self.capacity = capacity
+        self.in_flight = 0
+
+    async def _sleep(self, seconds: float):
+        self.in_flight += 1
+        try:
+            if self.capacity:
+                seconds *= max(1.0, self.in_flight / self.capacity)
+            await asyncio.sleep(seconds)
+        finally:
+            self.in_flight -= 1
+
+    async def ainvoke(self, messages, config=None):
+        from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+        last = messages[-1]
+        if isinstance(last, HumanMessage):
+            await self._sleep(self.latency)
+            query = last.content.lower()
+            if "revoestate" in query:
+                name = "revoestate_information"
+            elif "real estate" in query:
+                name = "companies_vector_search"
+            else:
+                name = "properties_vector_search"
+            return AIMessage(content="", tool_calls=[{"name": name, "args": {"query": last.content}, "id": uuid.uuid4().hex}],
+                             usage_metadata={"input_tokens": 3000, "output_tokens": 20, "total_tokens": 3020})
+        await self._sleep(self.answer_latency)
+        results = len(json.loads(last.content)) if isinstance(last, ToolMessage) and last.content.startswith("[") else 0
+        answer = f"Here are {results} results that match your request. " * 8
+        return AIMessage(content=answer, usage_metadata={"input_tokens": 5000, "output_tokens": 300, "total_tokens": 5300})
+
+
+def _evaluate(value, doc):
+    # Evaluates the expressions projections.py emits: field paths, $substrCP
+    # truncation (optionally wrapped in $cond on $type) and $meta score
+    if isinstance(value, str) and value.startswith("$"):
+        return doc.get(value[1:])
+    if isinstance(value, dict):
+        if "$meta" in value:
+            return doc.get("__score")
+        if "$cond" in value:
+            return _evaluate(value["$cond"][1], doc)
+        if "$substrCP" in value:
+            text, start, length = value["$substrCP"]
+            text = _evaluate(text, doc)
+            return text[start:start + length] if isinstance(text, str) else text
+    return value
+
+
+def apply_stages(doc: dict, stages):
+    for stage in stages:
+        if "$project" in stage:
+            spec = stage["$project"]
+            if all(v in (0, False) for k, v in spec.items() if not isinstance(v, dict)) and any(v in (0, False) for v in spec.values()):
+                doc = {k: v for k, v in doc.items() if spec.get(k, 1) not in (0, False)}
+                doc.update({k: _evaluate(v, doc) for k, v in spec.items() if isinstance(v, dict)})
+            else:
+                projected = {"_id": doc.get("_id")} if spec.get("_id", 1) not in (0, False) else {}
+                for k, v in spec.items():
+                    if k == "_id":
+                        continue
+                    if v in (1, True):
+                        if k in doc:
+                            projected[k] = doc[k]
+                    else:
+                        projected[k] = _evaluate(v, doc)
+                doc = projected
+        elif "$set" in stage:
+            doc = {**doc, **{k: _evaluate(v, doc) for k, v in stage["$set"].items()}}
+        elif "$unset" in stage:
+            fields = stage["$unset"] if isinstance(stage["$unset"], list) else [stage["$unset"]]
+            doc = {k: v for k, v in doc.items() if k not in fields}
+    doc.pop("__score", None)
+    return doc
+
+
+class StandInVectorBackend:
+    """Exact cosine search over the seeded collections, as a vector_backend."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._indexes = {}
+
+    def _index(self, collection):
+        if collection.name not in self._indexes:
+            docs = list(collection.find({"revoemb": {"$exists": True}}))
+            matrix = np.asarray([d["revoemb"] for d in docs], dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            self._indexes[collection.name] = (docs, matrix)
+        return self._indexes[collection.name]
+
+    def search(self, collection, index_name, query_vector, k, num_candidates, filters=None, stages=[]):
+        from mongomock.filtering import filter_applies
+
+        time.sleep(self.latency)  # network round trip to the cluster
+        docs, matrix = self._index(collection)
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        scores = matrix @ query
+        results = []
+        for i in np.argsort(-scores)[:num_candidates]:
+            if filters and not filter_applies(filters, docs[i]):
+                continue
+            results.append(apply_stages({**docs[i], "__score": float((1 + scores[i]) / 2)}, stages))
+            if len(results) == k:
+                break
+        return results
+
+
+def setup_app(args):
+    """Imports main:app against the stand-ins and seeds the catalog."""
+    import mongomock
+    import pymongo
+
+    os.environ.setdefault("MongoURI", "mongodb://stand-in")
+    os.environ.setdefault("GEMINI_API_KEY", "stand-in")
+    os.environ.setdefault("CHECKPOINTER", "memory")
+    os.environ.setdefault("METRICS", "off")
+    # Embed in-process rather than through a running embedding service
+    os.environ.pop("EMBEDDING_SOCKET", None)
+    client = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *a, **kw: client
+    # mongomock rejects custom type registries; its documents keep ObjectIds,
+    # which serialization.dumps and JSONResponse write as strings all the same
+    get_collection = mongomock.database.Database.get_collection
+    mongomock.database.Database.get_collection = (
+        lambda self, name, codec_options=None, **kwargs: get_collection(self, name, **kwargs)
+    )
+
+    embeddings = BagOfWordsEmbeddings(cpu_seconds=0 if args.real_embeddings else args.embed_cpu)
+    ingest_model = embeddings
+    if args.real_embeddings:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        ingest_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+    from ingest import document_to_text
+    db = client["revostate"]
+    properties, companies, revo = synthetic_catalog(args.properties, args.companies)
+    for doc, vector in zip(companies, ingest_model.embed_documents([document_to_text(d, is_company=True) for d in companies])):
+        doc["revoemb"] = vector
+    company_ids = db["companies"].insert_many(companies).inserted_ids
+    rng = random.Random(args.seed)
+    for doc, vector in zip(properties, ingest_model.embed_documents([document_to_text(d) for d in properties])):
+        doc["revoemb"] = vector
+        doc["companyId"] = rng.choice(company_ids)
+    db["properties"].insert_many(properties)
+    for doc, vector in zip(revo, ingest_model.embed_documents([d["text"] for d in revo])):
+        doc["revoemb"] = vector
+    db["revoinformation"].insert_many(revo)
+
+    import tool
+    if not args.real_embeddings:
+        tool.embedmodel = embeddings
+    tool.vector_backend = StandInVectorBackend(latency=args.mongo_latency)
+    import GeminiAgent
+    import main
+
+    agent = GeminiAgent.get_agent()
+    agent.model = agent.answer_model = ScriptedGemini(args.llm_latency, args.llm_answer_latency, args.llm_capacity)
+    GeminiAgent.revo_index.refresh()
+    if GeminiAgent.intent_router is not None:
+        asyncio.run(GeminiAgent.intent_router.prepare())
+    return main.app
+
+
+def reset_caches():
+    """Starts every level cold, so levels do not answer from each other's caches."""
+    import GeminiAgent
+    import tool
+
+    GeminiAgent.response_cache.clear()
+    tool.embedding_cache.clear()
+    tool.search_coalescer.invalidate()
+
+
+def rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return float("nan")
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) * 1000 if values else float("nan")
+
+
+async def drive(app, endpoint: str, queries, requests: int, concurrency: int, no_cache: bool) -> dict:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, shed = [], 0, 0
+    headers = {"Cache-Control": "no-cache"} if no_cache else {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        async def one(i):
+            nonlocal errors, shed
+            query = queries[i % len(queries)]
+            body = {"query": query, "thread_id": uuid.uuid4().hex} if endpoint == "/chatbot" else {"query": query}
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(endpoint, json=body, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code == 429:
+                    shed += 1
+                elif response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return {
+        "endpoint": endpoint, "concurrency": concurrency, "requests": requests, "errors": errors, "shed": shed,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1), "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "rss_mib": round(rss_mib(), 1),
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default="/properties-by-context,/chatbot")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--properties", type=int, default=2000)
+    parser.add_argument("--companies", type=int, default=60)
+    parser.add_argument("--distinct-queries", type=int, default=500, help="size of the query pool requests cycle through")
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="seconds per tool-choosing Gemini call")
+    parser.add_argument("--llm-answer-latency", type=float, default=1.2, help="seconds per answering Gemini call")
+    parser.add_argument("--llm-capacity", type=int, default=0, help="Gemini calls in flight before calls slow down (0: unlimited)")
+    parser.add_argument("--mongo-latency", type=float, default=0.02, help="seconds per vector search round trip")
+    parser.add_argument("--embed-cpu", type=float, default=0.004, help="CPU seconds per stand-in query embedding")
+    parser.add_argument("--real-embeddings", action="store_true", help="use all-MiniLM-L6-v2 instead of the stand-in")
+    parser.add_argument("--no-cache", action="store_true", help="send Cache-Control: no-cache to /chatbot")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(args.seed)
+    app = setup_app(args)
+    queries = query_pool(args.distinct_queries)
+    random.Random(args.seed).shuffle(queries)
+
+    results = []
+    print(f"{'endpoint':<24}{'conc':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'shed':>6}{'RSS MiB':>9}")
+    for endpoint in args.endpoints.split(","):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            reset_caches()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = asyncio.run(drive(app, endpoint, queries, args.requests, concurrency, args.no_cache))
+            results.append(result)
+            print(f"{endpoint:<24}{concurrency:>5}{result['rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                  f"{result['p99_ms']:>9}{result['errors']:>8}{result['shed']:>6}{result['rss_mib']:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
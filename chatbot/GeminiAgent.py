@@ -3,16 +3,28 @@ import logging
 import os
 import json
 import operator
+import threading
+import time
 from typing import TypedDict, List, Annotated
 from langchain_core.tools import tool
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import AnyMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from tool import properties_vector_search, companies_vector_search,revoestate_information
-from langgraph.checkpoint.memory import MemorySaver
-checkpointer = MemorySaver()
+from tool import properties_vector_search, companies_vector_search,revoestate_information, company_by_id, nearby_properties_search, embed_query, search_coalescer
+from checkpointer import create_checkpointer
+from collection_watcher import CollectionWatcher
+from company_cache import CompanyCache
+from local_index import InMemoryVectorIndex
+from context_budget import ContextBudget
+from response_cache import SemanticResponseCache
+from intent_router import IntentRouter
+from metrics import metrics
+from tool import embedding_cache
+from serialization import JSON_CODEC_OPTIONS, dumps
+from scheduler import ConcurrencyLimiter, DeadlineExceeded, within_deadline
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,33 +37,104 @@ if not GEMINI_API_KEY or not CONNECTION_STRING:
     logger.error("Missing required environment variables: MongoURI or GEMINI_API_KEY")
     raise ValueError("Missing required environment variables.")
 
-# Initialize MongoDB client with timeout settings
+# Conversation history sent to Gemini per call
+context_budget = ContextBudget(
+    keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "3")),
+    max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "12000"))
+)
+
+# Tool execution limits per LLM turn
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+
+# Request scheduling per worker (see scheduler.py): up to AGENT_CONCURRENCY
+# agent runs at once, AGENT_QUEUE_SIZE more waiting at most
+# AGENT_QUEUE_WAIT_SECONDS, the rest rejected with 429. Every run must finish
+# within REQUEST_DEADLINE_SECONDS, makes at most MAX_TOOL_ROUNDS rounds of tool
+# calls, and shares the worker's GEMINI_CONCURRENCY in-flight Gemini calls.
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "32"))
+AGENT_QUEUE_SIZE = int(os.getenv("AGENT_QUEUE_SIZE", "64"))
+AGENT_QUEUE_WAIT_SECONDS = float(os.getenv("AGENT_QUEUE_WAIT_SECONDS", "10"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "45"))
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "3"))
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# Backstop for the graph: route, then llm and action per round, then the answer
+RECURSION_LIMIT = 2 * MAX_TOOL_ROUNDS + 4
+DEADLINE_MESSAGE = "Sorry, this is taking longer than expected. Please try again in a moment."
+
+admission = ConcurrencyLimiter(AGENT_CONCURRENCY, max_queued=AGENT_QUEUE_SIZE, max_wait=AGENT_QUEUE_WAIT_SECONDS)
+gemini_limiter = ConcurrencyLimiter(GEMINI_CONCURRENCY)
+agent_limits = {"deadline_exceeded": 0, "tool_rounds_capped": 0}
+
+# Initialize MongoDB client with timeout settings. connect=False defers
+# connecting to the first operation, so importing this module does no I/O and
+# the client is safe to create before gunicorn forks the workers.
 mongo_client = MongoClient(
     CONNECTION_STRING,
     serverSelectionTimeoutMS=30000,
     connectTimeoutMS=30000,
-    socketTimeoutMS=30000
+    socketTimeoutMS=30000,
+    connect=False
 )
 
-properties_collection = mongo_client["revostate"]["properties"]
-companies_collection = mongo_client["revostate"]["companies"]
-revoestate_collection = mongo_client["revostate"]["revoinformation"]
+# Documents from these collections decode ObjectIds to strings (see serialization.py)
+properties_collection = mongo_client["revostate"].get_collection("properties", codec_options=JSON_CODEC_OPTIONS)
+companies_collection = mongo_client["revostate"].get_collection("companies", codec_options=JSON_CODEC_OPTIONS)
+revoestate_collection = mongo_client["revostate"].get_collection("revoinformation", codec_options=JSON_CODEC_OPTIONS)
+
+# Invalidate cached answers when the data they were built from changes
+collection_watcher = CollectionWatcher(
+    [properties_collection, companies_collection, revoestate_collection],
+    poll_interval=float(os.getenv("WATCH_POLL_SECONDS", "30"))
+)
+response_cache = SemanticResponseCache(
+    threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+)
+collection_watcher.subscribe(response_cache.invalidate)
+collection_watcher.subscribe(search_coalescer.invalidate)
 
+# Companies are few and looked up by id on almost every property answer
+company_cache = CompanyCache(companies_collection, max_age=float(os.getenv("COMPANY_CACHE_MAX_AGE_SECONDS", "600")))
+collection_watcher.subscribe(company_cache.invalidate)
 
+# revoinformation is a few hundred chunks of revo.pdf, searched in memory
+revo_index = InMemoryVectorIndex(revoestate_collection, fields=["text"], max_age=float(os.getenv("REVO_INDEX_MAX_AGE_SECONDS", "3600")))
+collection_watcher.subscribe(revo_index.invalidate)
 
-try:
-    logger.info("Properties count: %d", properties_collection.count_documents({}))
-    logger.info("Companies count: %d", companies_collection.count_documents({}))
-except Exception as e:
-    logger.error("MongoDB connection error: %s", str(e))
-    raise
+# Confident first-turn queries call their tool directly, skipping the Gemini
+# call that would only choose the tool. Set INTENT_ROUTER=off to disable.
+intent_router = IntentRouter(
+    embed_query,
+    threshold=float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.6")),
+    margin=float(os.getenv("INTENT_ROUTER_MARGIN", "0.05"))
+) if os.getenv("INTENT_ROUTER", "on") != "off" else None
+
+# Component stats exported on /metrics
+metrics.register_stats("embedding_cache", embedding_cache.stats)
+metrics.register_stats("response_cache", response_cache.stats)
+metrics.register_stats("search_cache", search_coalescer.stats)
+metrics.register_stats("context", context_budget.stats)
+metrics.register_stats("admission", admission.stats)
+metrics.register_stats("gemini", gemini_limiter.stats)
+metrics.register_stats("agent_limits", lambda: dict(agent_limits))
+metrics.register_stats("checkpoints", lambda: checkpointer.stats() if hasattr(checkpointer, "stats") else None, every=60)
+metrics.register_stats(
+    "reembed_worker",
+    lambda: (mongo_client["revostate"]["ingest_state"].find_one({"_id": "reembed_worker"}) or {}).get("stats"),
+    every=60
+)
+if intent_router is not None:
+    metrics.register_stats("intent_router", intent_router.stats)
 
 class AgentState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
 
 
 system_prompt = """
-You are Revoestate, a knowledgeable and friendly AI Assistant specializing in real estate properties and companies in Addis Ababa, Ethiopia. Your primary function is to provide accurate, tailored information related to Ethiopian real estate. You do not answer queries unrelated to this topic; instead, you politely redirect users to ask about real estate. Your goal is to deliver comprehensive responses that match the user's request exactly, using the tools `properties_vector_search`, `companies_vector_search`, and `revoestate_information` efficiently.
+You are Revoestate, a knowledgeable and friendly AI Assistant specializing in real estate properties and companies in Addis Ababa, Ethiopia. Your primary function is to provide accurate, tailored information related to Ethiopian real estate. You do not answer queries unrelated to this topic; instead, you politely redirect users to ask about real estate. Your goal is to deliver comprehensive responses that match the user's request exactly, using the tools `properties_vector_search`, `companies_vector_search`, `company_by_id`, and `revoestate_information` efficiently.
 
 Key Guidelines:
 
@@ -78,7 +161,7 @@ Key Guidelines:
    - When recommending properties based on user needs (family size, budget, location), apply the following reasoning:
      * For larger families (e.g., 6+ members), suggest properties with at least 3 bedrooms and large living areas (e.g., 150+ sqm) to accommodate communal activities and ensure comfort.
      * Filter properties to match the user’s specified budget (e.g., up to 80,000 ETB per month for rent). If no exact matches are found, include properties slightly above the budget with a note that they may be negotiable.
-     * Prioritize properties in the user’s specified subcity or district (e.g., Bole). If no matches are found, suggest properties in nearby areas (e.g., Yeka, CMC) and note the proximity.
+     * Prioritize properties in the user’s specified subcity or district (e.g., Bole). If no matches are found, call `nearby_properties_search` once for that subcity (it widens the area by itself) and note the proximity using its `area` field.
      * For families, prioritize houses or spacious apartments with family-friendly amenities such as parking, gardens, security, and proximity to schools or markets.
      * Example response structure: "Based on your needs for a family of 10 in Bole with a budget of 80,000 ETB per month, I recommend properties with at least 3 bedrooms and spacious living areas. Here are some options:" followed by property details. If no matches, state: "I couldn’t find properties in Bole for 80,000 ETB that suit a family of 10. Here are options in nearby areas or with a slightly higher budget."
 
@@ -88,7 +171,7 @@ Key Guidelines:
      * Use `companies_vector_search` with the company name or relevant query (e.g., "Noah Real Estate").
      * Include: company name, services, contact details (phone, email, website), address, years in operation, specializations.
      * If no results: "I couldn’t find information about [company name] in my database. Please check the company name or try another query."
-   - For queries about companies related to a specific property (e.g., "Who is the real estate company for this property?"), use `companies_vector_search` with the `companyId` from the property data.
+   - For queries about companies related to a specific property (e.g., "Who is the real estate company for this property?"), use `company_by_id` with the `companyId` from the property data (pass all relevant ids in one call).
    - Do not require property IDs or related property data for standalone company queries.
 
 4. Revoestate Platform Information:
@@ -112,9 +195,12 @@ Key Guidelines:
 6. Tool Usage:
    - Use tools efficiently:
      * `properties_vector_search`: For property queries.
-     * `companies_vector_search`: For company queries (standalone or related to properties).
+     * `companies_vector_search`: For standalone company queries by name or description.
+     * `nearby_properties_search`: For properties near a landmark or neighbourhood (e.g., "near CMC"), or nearby alternatives when a subcity has no matches. Do not guess neighbouring subcities with repeated `properties_vector_search` calls.
+     * `company_by_id`: For the company behind properties, using their `companyId` values.
      * `revoestate_information`: For platform queries.
    - Make multiple calls if needed.
+   - Results contain the key fields and a shortened description. Pass `detail=true` to `properties_vector_search` or `companies_vector_search` only when the user asks for full details, coordinates, or the complete description.
    - If no results:
      * `properties_vector_search`: "I couldn’t find any properties matching your criteria."
      * `companies_vector_search`: "I couldn’t find information about [company name]."
@@ -130,80 +216,259 @@ As Revoestate AI Assistant, you ensure accurate, query-specific responses, using
 
 # Define Agent class
 class Agent:
-    def __init__(self, model, tools,checkpointer, system=""):
+    def __init__(self, model, tools,checkpointer, system="", router=None):
         self.system = system
+        self.router = router
         graph = StateGraph(AgentState)
+        graph.add_node("route", self.route)
         graph.add_node("llm", self.call_gemini)
         graph.add_node("action", self.take_action)
+        graph.add_conditional_edges(
+            "route",
+            self.exists_action,
+            {True: "action", False: "llm"}
+        )
         graph.add_conditional_edges(
             "llm",
             self.exists_action,
             {True: "action", False: END}
         )
         
-        graph.set_entry_point("llm")
+        graph.set_entry_point("route")
         graph.add_edge("action", "llm")
 
         self.tools = {t.name: t for t in tools}
         self.model = model.bind_tools(tools)
+        # After MAX_TOOL_ROUNDS, Gemini must answer with what it has
+        self.answer_model = model.bind_tools(tools, tool_choice="none")
         self.graph = graph.compile(checkpointer=checkpointer)
 
     def exists_action(self, state: AgentState):
         result = state['messages'][-1]
-        return len(result.tool_calls) > 0
+        return len(getattr(result, 'tool_calls', None) or []) > 0
 
-    def call_gemini(self, state: AgentState):
+    @metrics.timed("route")
+    async def route(self, state: AgentState):
+        # Only the first turn of a thread is routed; follow-ups need the history
         messages = state['messages']
+        if self.router is None or len(messages) != 1 or not isinstance(messages[0].content, str):
+            return {'messages': []}
+        query = messages[0].content
+        try:
+            intent, score = await within_deadline(self.router.classify(query))
+        except Exception as e:
+            logger.error("Intent router error: %s", str(e))
+            return {'messages': []}
+        if intent is None:
+            return {'messages': []}
+        logger.info("Routed query to %s (similarity %.2f)", intent, score)
+        return {'messages': [AIMessage(content="", tool_calls=[self.router.tool_call(intent, query)])]}
+
+    @metrics.timed("llm")
+    async def call_gemini(self, state: AgentState, config: RunnableConfig):
+        messages = context_budget.apply(state['messages'], system=self.system)
         if self.system:
             messages = [SystemMessage(content=self.system)] + messages
-        message = self.model.invoke(messages)
+        rounds = tool_rounds(state['messages'])
+        model = self.model
+        if rounds >= MAX_TOOL_ROUNDS:
+            agent_limits["tool_rounds_capped"] += 1
+            logger.info("Reached %d tool rounds, asking for the answer", rounds)
+            model = self.answer_model
+        try:
+            async with gemini_limiter.slot():
+                # Passing the config on lets astream_events see model tokens (Python 3.10
+                # does not propagate it to child runs through contextvars)
+                message = await within_deadline(model.ainvoke(messages, config), LLM_TIMEOUT_SECONDS)
+        except DeadlineExceeded:
+            # End the turn with an answer so the thread never stops on an unanswered tool call
+            logger.error("Request deadline exceeded before Gemini answered")
+            agent_limits["deadline_exceeded"] += 1
+            return {'messages': [AIMessage(content=DEADLINE_MESSAGE)]}
+        context_budget.record_usage(message)
         return {'messages': [message]}
 # take action
-    def take_action(self, state: AgentState):
+    def tool_args(self, t):
+        # Pass collections to tool functions
+        if t['name'] in ('properties_vector_search', 'nearby_properties_search'):
+            return {**t['args'], 'properties_collection': properties_collection}
+        elif t['name'] == 'companies_vector_search':
+            return {**t['args'], 'companies_collection': companies_collection}
+        elif t['name'] == 'revoestate_information':
+            return {'query': t['args']['query'], 'revoestate_collection': revoestate_collection, 'revo_index': revo_index}
+        elif t['name'] == 'company_by_id':
+            return {'company_ids': t['args']['company_ids'], 'company_cache': company_cache}
+        return t['args']
+
+    async def run_tool(self, t, semaphore: asyncio.Semaphore, config: RunnableConfig = None) -> ToolMessage:
+        logger.info("Calling tool: %s", t['name'])
+        if t['name'] not in self.tools:
+            logger.debug("Bad tool name: %s", t['name'])
+            return ToolMessage(tool_call_id=t['id'], name=t['name'], content=json.dumps("bad tool name, retry"))
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await within_deadline(
+                    self.tools[t['name']].ainvoke(self.tool_args(t), config),
+                    TOOL_TIMEOUT_SECONDS
+                )
+            except DeadlineExceeded:
+                # The whole request is out of time, not just this tool
+                raise
+            except asyncio.TimeoutError:
+                logger.error("Tool %s timed out after %.1f s", t['name'], TOOL_TIMEOUT_SECONDS)
+                result = "tool timed out, retry"
+            except Exception as e:
+                logger.error("Tool %s error: %s", t['name'], str(e))
+                result = f"tool error: {str(e)}"
+            latency_ms = (time.perf_counter() - start) * 1000
+        metrics.observe(t['name'], latency_ms / 1000, "revo_tool_seconds", "tool")
+        logger.info("Tool %s finished in %.1f ms", t['name'], latency_ms)
+        # Preserve result as a dictionary for detailed formatting
+        return ToolMessage(
+            tool_call_id=t['id'],
+            name=t['name'],
+            content=dumps(result),
+            response_metadata={"latency_ms": round(latency_ms, 1)}
+        )
+
+    @metrics.timed("action")
+    async def take_action(self, state: AgentState, config: RunnableConfig):
         tool_calls = state['messages'][-1].tool_calls
-        results = []
-        for t in tool_calls:
-            logger.info("Calling tool: %s", t['name'])
-            if t['name'] not in self.tools:
-                print("\n ....bad tool name....")
-                result = "bad tool name, retry"
-            else:
-                # Pass collections to tool functions
-                if t['name'] == 'properties_vector_search':
-                    result = self.tools[t['name']].invoke({'query': t['args']['query'], 'properties_collection': properties_collection})
-                elif t['name'] == 'companies_vector_search':
-                    result = self.tools[t['name']].invoke({'query': t['args']['query'], 'companies_collection': companies_collection})
-                elif t['name'] == 'revoestate_information':
-                    result = self.tools[t['name']].invoke({'query': t['args']['query'], 'revoestate_collection': revoestate_collection})
-                else:
-                    result = self.tools[t['name']].invoke(t['args'])
-            # Preserve result as a dictionary for detailed formatting
-            results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=json.dumps(result)))
-        print("Back to the model!")
+        # Run all tool calls of this turn concurrently; gather keeps the original order
+        semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+        try:
+            results = await asyncio.gather(*(self.run_tool(t, semaphore, config) for t in tool_calls))
+        except DeadlineExceeded:
+            # Answer every call so the thread stays valid; the model node then ends the turn
+            logger.error("Request deadline exceeded during tool calls")
+            results = [
+                ToolMessage(tool_call_id=t['id'], name=t['name'], content=json.dumps("request deadline exceeded"))
+                for t in tool_calls
+            ]
+        logger.debug("Back to the model")
         logger.info("Tool results: %s", results)
-        return {'messages': results}
+        return {'messages': list(results)}
     
 
-# Initialize LLM and Agent
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=GEMINI_API_KEY,
-    temperature=0.7
-)
-tools = [properties_vector_search, companies_vector_search,revoestate_information]
-agent = Agent(model=llm, tools=tools, system=system_prompt, checkpointer=checkpointer)
-
-# Run agent
-async def run_agent(query: str) -> str:
-    state = {
-        "messages": [HumanMessage(content=query)]
-    }
-    try:
-        result = await agent.graph.ainvoke(state)
-        last_message = result["messages"][-1].content
-        return last_message
-    except Exception as e:
-        logger.error("Agent execution error: %s", str(e))
-        if "tool_results" in locals() and locals().get("tool_results"):
-            return json.dumps(locals()["tool_results"], indent=2)
-        return f"Sorry, an error occurred: {str(e)}"
\ No newline at end of file
+def tool_rounds(messages: List[AnyMessage]) -> int:
+    """Number of tool-calling Gemini turns since the user's last message."""
+    rounds = 0
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, AIMessage) and message.tool_calls:
+            rounds += 1
+    return rounds
+
+# Collections each tool reads, for invalidating cached answers
+TOOL_COLLECTIONS = {
+    "properties_vector_search": "properties",
+    "nearby_properties_search": "properties",
+    "companies_vector_search": "companies",
+    "company_by_id": "companies",
+    "revoestate_information": "revoinformation",
+}
+
+def turn_collections(messages: List[AnyMessage]) -> set:
+    """Collections read by the tool calls since the user's last message."""
+    collections = set()
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage) and message.name in TOOL_COLLECTIONS:
+            collections.add(TOOL_COLLECTIONS[message.name])
+    return collections
+
+def agent_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}, "recursion_limit": RECURSION_LIMIT}
+
+tools = [properties_vector_search, companies_vector_search,revoestate_information, company_by_id, nearby_properties_search]
+
+# The checkpointer (SQLite connection) and the Gemini client (gRPC channels)
+# must not be created before gunicorn forks, so each worker builds its agent
+# on first use or during warm-up
+checkpointer = None
+_agent = None
+_agent_pid = None
+_agent_lock = threading.Lock()
+
+def get_agent() -> Agent:
+    global checkpointer, _agent, _agent_pid
+    if _agent is None or _agent_pid != os.getpid():
+        with _agent_lock:
+            if _agent is None or _agent_pid != os.getpid():
+                # Conversation state: "sqlite" is shared by the workers of one container,
+                # "mongo" by every replica, "memory" is per process (development only)
+                checkpointer = create_checkpointer(
+                    os.getenv("CHECKPOINTER", "sqlite"),
+                    mongo_client=mongo_client,
+                    path=os.getenv("CHECKPOINT_PATH", "/tmp/revo-checkpoints.sqlite"),
+                    ttl=float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 86400))),
+                    max_messages=int(os.getenv("CHECKPOINT_MAX_MESSAGES", "40"))
+                )
+                llm = ChatGoogleGenerativeAI(
+                    model="gemini-2.5-flash",
+                    google_api_key=GEMINI_API_KEY,
+                    temperature=0.7
+                )
+                _agent = Agent(model=llm, tools=tools, system=system_prompt, checkpointer=checkpointer, router=intent_router)
+                _agent_pid = os.getpid()
+    return _agent
+
+# Startup state of this worker, reported by /readyz; warm_up_seconds is the
+# time from the start of the warm-up until the worker became ready
+readiness = {"ready": False, "import_seconds": None, "warm_up_seconds": None, "errors": {}}
+REQUIRED_FOR_READY = ("mongo", "embeddings", "agent")
+NEEDS_MONGO = ("collection_sizes", "revo_index")
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", "10"))
+
+def ping_mongo():
+    mongo_client.admin.command("ping")
+
+def log_collection_sizes():
+    # Estimated counts come from collection metadata instead of a full count
+    logger.info("Properties count: ~%d", properties_collection.estimated_document_count())
+    logger.info("Companies count: ~%d", companies_collection.estimated_document_count())
+
+async def warm_up():
+    """Builds this worker's lazy resources so the first request does not pay for them.
+
+    Failed steps are logged and retried every WARM_UP_RETRY_SECONDS (requests
+    in the meantime build what they need lazily). The worker is ready once
+    Mongo, the embeddings and the agent are available.
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    steps = [
+        ("mongo", lambda: loop.run_in_executor(None, ping_mongo)),
+        ("collection_sizes", lambda: loop.run_in_executor(None, log_collection_sizes)),
+        ("agent", lambda: loop.run_in_executor(None, get_agent)),
+        ("embeddings", lambda: embed_query("warm up")),
+        ("revo_index", lambda: loop.run_in_executor(None, revo_index.refresh)),
+    ]
+    if intent_router is not None:
+        steps.append(("intent_router", intent_router.prepare))
+    errors = readiness["errors"]
+    while True:
+        failed = []
+        for name, step in steps:
+            if name in NEEDS_MONGO and "mongo" in errors:
+                failed.append((name, step))
+                continue
+            try:
+                with metrics.timer(f"warm_up_{name}"):
+                    await step()
+                errors.pop(name, None)
+            except Exception as e:
+                logger.error("Warm-up step %s failed: %s", name, str(e))
+                errors[name] = str(e)
+                failed.append((name, step))
+        readiness["ready"] = not any(name in errors for name in REQUIRED_FOR_READY)
+        if readiness["ready"] and readiness["warm_up_seconds"] is None:
+            readiness["warm_up_seconds"] = round(time.perf_counter() - start, 3)
+        logger.info("Warm-up pass finished after %.2fs (ready: %s)", time.perf_counter() - start, readiness["ready"])
+        if not failed:
+            return
+        steps = failed
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
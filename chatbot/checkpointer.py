@@ -0,0 +1,428 @@
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+from bson.binary import Binary
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from pymongo import ASCENDING, UpdateOne
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def trim_messages(messages: List, max_messages: int) -> List:
+    """Keeps at most ``max_messages`` messages, starting at a user turn.
+
+    Cutting at a HumanMessage keeps every AIMessage tool call together with
+    its ToolMessages. A single turn longer than the cap is kept whole.
+    """
+    if len(messages) <= max_messages:
+        return messages
+    start = len(messages) - max_messages
+    for i in range(start, len(messages)):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    for i in range(start - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages
+
+
+class BoundedCheckpointSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver that keeps only the latest checkpoint of each thread.
+
+    The chatbot never replays old checkpoints, so storing one record per
+    thread bounds storage by the number of active threads. The ``messages``
+    channel is capped at ``max_messages`` and threads idle for longer than
+    ``ttl`` seconds are expired. Subclasses implement the storage primitives.
+    """
+
+    def __init__(self, ttl: float = 7 * 86400, max_messages: int = 40):
+        super().__init__()
+        self.ttl = ttl
+        self.max_messages = max_messages
+
+    # Storage primitives
+    def _read(self, thread_id: str, checkpoint_ns: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def _write(self, record: dict):
+        raise NotImplementedError
+
+    def _write_pending(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: List[tuple]):
+        raise NotImplementedError
+
+    def delete_thread(self, thread_id: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+    def _to_tuple(self, record: dict) -> CheckpointTuple:
+        thread_id, checkpoint_ns = record["thread_id"], record["checkpoint_ns"]
+        checkpoint = self.serde.loads_typed(record["checkpoint"])
+        parent_checkpoint_id = record.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": record["checkpoint_id"]}},
+            checkpoint={**checkpoint, "pending_sends": []},
+            metadata=self.serde.loads_typed(record["metadata"]),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, _, channel, value_type, value, _ in record.get("writes", [])
+            ],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        record = self._read(thread_id, checkpoint_ns)
+        if record is None:
+            return None
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id and checkpoint_id != record["checkpoint_id"]:
+            # Only the latest checkpoint is kept
+            return None
+        return self._to_tuple(record)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config is None or limit == 0:
+            return
+        checkpoint_tuple = self.get_tuple(config)
+        if checkpoint_tuple is None:
+            return
+        if before and checkpoint_tuple.config["configurable"]["checkpoint_id"] >= get_checkpoint_id(before):
+            return
+        if filter and any(checkpoint_tuple.metadata.get(k) != v for k, v in filter.items()):
+            return
+        yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        values = dict(c.get("channel_values", {}))
+        if "messages" in values:
+            values["messages"] = trim_messages(values["messages"], self.max_messages)
+        c["channel_values"] = values
+        self._write({
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "checkpoint": self.serde.dumps_typed(c),
+            "metadata": self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+            "updated_at": time.time(),
+        })
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_bytes = self.serde.dumps_typed(value)
+            rows.append((task_id, WRITES_IDX_MAP.get(channel, idx), channel, value_type, value_bytes, task_path))
+        self._write_pending(
+            config["configurable"]["thread_id"],
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+            rows
+        )
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._run(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await self._run(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self._run(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await self._run(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await self._run(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+class SQLiteCheckpointSaver(BoundedCheckpointSaver):
+    """Local file backend, shared by all workers of one container (WAL mode)."""
+
+    def __init__(self, path: str, ttl: float = 7 * 86400, max_messages: int = 40, expire_interval: float = 300):
+        super().__init__(ttl=ttl, max_messages=max_messages)
+        self.path = path
+        self.expire_interval = expire_interval
+        self._last_expiry = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                checkpoint_type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns)
+            );
+            CREATE INDEX IF NOT EXISTS checkpoints_updated_at ON checkpoints (updated_at);
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                value_type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, task_id, idx)
+            );
+        """)
+        self._conn.commit()
+
+    def _read(self, thread_id: str, checkpoint_ns: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata "
+                "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND updated_at >= ?",
+                (thread_id, checkpoint_ns, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            writes = self._conn.execute(
+                "SELECT task_id, idx, channel, value_type, value, task_path FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, row[0])
+            ).fetchall()
+        return {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": row[0],
+            "parent_checkpoint_id": row[1],
+            "checkpoint": (row[2], row[3]),
+            "metadata": (row[4], row[5]),
+            "writes": writes,
+        }
+
+    def _write(self, record: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record["thread_id"], record["checkpoint_ns"], record["checkpoint_id"], record["parent_checkpoint_id"],
+                    *record["checkpoint"], *record["metadata"], record["updated_at"],
+                )
+            )
+            # Writes of the previous checkpoint are no longer needed
+            self._conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (record["thread_id"], record["checkpoint_ns"], record["checkpoint_id"])
+            )
+            self._conn.commit()
+        if record["updated_at"] - self._last_expiry > self.expire_interval:
+            self.expire()
+
+    def _write_pending(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: List[tuple]):
+        with self._lock:
+            for task_id, idx, channel, value_type, value, task_path in rows:
+                # Regular writes are never overwritten, special ones (errors, interrupts) are
+                self._conn.execute(
+                    f"INSERT OR {'IGNORE' if idx >= 0 else 'REPLACE'} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path)
+                )
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def expire(self):
+        """Deletes threads idle for longer than the TTL."""
+        self._last_expiry = time.time()
+        with self._lock:
+            cutoff = self._last_expiry - self.ttl
+            deleted = self._conn.execute("DELETE FROM checkpoints WHERE updated_at < ?", (cutoff,)).rowcount
+            self._conn.execute(
+                "DELETE FROM writes WHERE NOT EXISTS (SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id "
+                "AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)"
+            )
+            self._conn.commit()
+        if deleted:
+            logger.info("Expired %d idle conversation threads", deleted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            threads, total, largest = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0), "
+                "COALESCE(MAX(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints"
+            ).fetchone()
+            writes_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+        return {"backend": "sqlite", "threads": threads, "bytes": total + writes_bytes, "max_thread_bytes": largest}
+
+
+class MongoCheckpointSaver(BoundedCheckpointSaver):
+    """MongoDB backend, shared by every worker and replica.
+
+    Idle threads are removed by a TTL index on ``updated_at``.
+    """
+
+    def __init__(self, collection, ttl: float = 7 * 86400, max_messages: int = 40):
+        super().__init__(ttl=ttl, max_messages=max_messages)
+        self.collection = collection
+        self.collection.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING)], unique=True)
+        self.collection.create_index("updated_at", expireAfterSeconds=int(ttl))
+
+    def _read(self, thread_id: str, checkpoint_ns: str) -> Optional[dict]:
+        doc = self.collection.find_one({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns})
+        if doc is None:
+            return None
+        return {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": doc["checkpoint_id"],
+            "parent_checkpoint_id": doc.get("parent_checkpoint_id"),
+            "checkpoint": (doc["checkpoint_type"], bytes(doc["checkpoint"])),
+            "metadata": (doc["metadata_type"], bytes(doc["metadata"])),
+            "writes": sorted(
+                (w["task_id"], w["idx"], w["channel"], w["value_type"], bytes(w["value"]), w["task_path"])
+                for w in doc.get("writes", {}).values()
+            ),
+        }
+
+    def _write(self, record: dict):
+        self.collection.replace_one(
+            {"thread_id": record["thread_id"], "checkpoint_ns": record["checkpoint_ns"]},
+            {
+                "thread_id": record["thread_id"],
+                "checkpoint_ns": record["checkpoint_ns"],
+                "checkpoint_id": record["checkpoint_id"],
+                "parent_checkpoint_id": record["parent_checkpoint_id"],
+                "checkpoint_type": record["checkpoint"][0],
+                "checkpoint": Binary(record["checkpoint"][1]),
+                "metadata_type": record["metadata"][0],
+                "metadata": Binary(record["metadata"][1]),
+                "size": len(record["checkpoint"][1]) + len(record["metadata"][1]),
+                "writes": {},
+                "updated_at": datetime.fromtimestamp(record["updated_at"], tz=timezone.utc),
+            },
+            upsert=True
+        )
+
+    def _write_pending(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, rows: List[tuple]):
+        operations = []
+        for task_id, idx, channel, value_type, value, task_path in rows:
+            key = f"writes.{task_id}|{idx}"
+            filter_ = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}
+            if idx >= 0:
+                # Regular writes are never overwritten, special ones (errors, interrupts) are
+                filter_[key] = {"$exists": False}
+            operations.append(UpdateOne(filter_, {"$set": {key: {
+                "task_id": task_id, "idx": idx, "channel": channel,
+                "value_type": value_type, "value": Binary(value), "task_path": task_path,
+            }}}))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.collection.delete_many({"thread_id": thread_id})
+
+    def stats(self) -> dict:
+        result = list(self.collection.aggregate([
+            {"$group": {"_id": None, "threads": {"$sum": 1}, "bytes": {"$sum": "$size"}, "max_thread_bytes": {"$max": "$size"}}}
+        ]))
+        summary = result[0] if result else {"threads": 0, "bytes": 0, "max_thread_bytes": 0}
+        return {"backend": "mongo", "threads": summary["threads"], "bytes": summary["bytes"], "max_thread_bytes": summary["max_thread_bytes"]}
+
+
+def create_checkpointer(backend: str, mongo_client=None, path: str = "/tmp/revo-checkpoints.sqlite",
+                        ttl: float = 7 * 86400, max_messages: int = 40):
+    """Builds the checkpointer selected by ``backend`` ("sqlite", "mongo" or "memory")."""
+    if backend == "mongo":
+        return MongoCheckpointSaver(mongo_client["revostate"]["chat_checkpoints"], ttl=ttl, max_messages=max_messages)
+    if backend == "sqlite":
+        return SQLiteCheckpointSaver(path, ttl=ttl, max_messages=max_messages)
+    if backend == "memory":
+        return MemorySaver()
+    raise ValueError(f"Unknown checkpointer backend: {backend}")
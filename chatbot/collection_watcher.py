@@ -0,0 +1,86 @@
+import logging
+import threading
+from typing import Callable, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CollectionWatcher:
+    """Notifies subscribers when watched collections change.
+
+    Each collection is tailed with a change stream in a daemon thread. Where
+    change streams are unavailable (standalone servers, missing privileges)
+    the watcher falls back to polling a cheap fingerprint: the estimated
+    document count plus the newest ``updatedAt``. Callbacks receive the
+    collection name and the change event (``None`` when detected by polling).
+    """
+
+    def __init__(self, collections: List, poll_interval: float = 30.0):
+        self.collections = collections
+        self.poll_interval = poll_interval
+        self._callbacks: List[Callable[[str, Optional[dict]], None]] = []
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def subscribe(self, callback: Callable[[str, Optional[dict]], None]):
+        self._callbacks.append(callback)
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for collection in self.collections:
+            thread = threading.Thread(target=self._watch, args=(collection,), name=f"watch-{collection.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _notify(self, name: str, change: Optional[dict]):
+        for callback in self._callbacks:
+            try:
+                callback(name, change)
+            except Exception as e:
+                logger.error("Collection watcher callback error: %s", str(e))
+
+    def _watch(self, collection):
+        resume_token = None
+        while not self._stop.is_set():
+            try:
+                with collection.watch(resume_after=resume_token, max_await_time_ms=1000) as stream:
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        resume_token = stream.resume_token
+                        if change is not None:
+                            self._notify(collection.name, change)
+            except OperationFailure as e:
+                logger.info("Change streams unavailable on %s (%s), polling every %.0f s", collection.name, str(e), self.poll_interval)
+                self._poll(collection)
+                return
+            except PyMongoError as e:
+                logger.error("Change stream error on %s: %s", collection.name, str(e))
+                self._stop.wait(self.poll_interval)
+
+    def _fingerprint(self, collection):
+        latest = collection.find_one({"updatedAt": {"$exists": True}}, {"updatedAt": 1}, sort=[("updatedAt", -1)])
+        return collection.estimated_document_count(), latest.get("updatedAt") if latest else None
+
+    def _poll(self, collection):
+        previous = None
+        while not self._stop.is_set():
+            try:
+                current = self._fingerprint(collection)
+                if previous is not None and current != previous:
+                    self._notify(collection.name, None)
+                previous = current
+            except PyMongoError as e:
+                logger.error("Polling error on %s: %s", collection.name, str(e))
+            self._stop.wait(self.poll_interval)
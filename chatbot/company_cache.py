@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from projections import PROJECTIONS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CompanyCache:
+    """In-process copy of the (small) companies collection, keyed by ``_id``.
+
+    The whole collection is loaded on first use and reloaded after
+    ``max_age`` seconds. Change events evict single companies, which are then
+    fetched again by id; a change detected without an event (polling) marks
+    the whole cache stale. Ids that are not cached are fetched in one batched
+    ``$in`` query.
+    """
+
+    def __init__(self, collection, max_age: float = 600):
+        self.collection = collection
+        self.max_age = max_age
+        self.projection = {field: 0 for field in PROJECTIONS["companies"]["exclude"]}
+        self._companies: Dict[str, dict] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+
+    def refresh(self):
+        companies = {str(doc["_id"]): doc for doc in self.collection.find({}, self.projection)}
+        with self._lock:
+            self._companies = companies
+            self._loaded_at = time.monotonic()
+        logger.info("Loaded %d companies into the company cache", len(companies))
+
+    def invalidate(self, collection_name: str = "", change: Optional[dict] = None):
+        """CollectionWatcher callback."""
+        if collection_name and collection_name != self.collection.name:
+            return
+        with self._lock:
+            document_key = (change or {}).get("documentKey", {}).get("_id")
+            if document_key is not None:
+                self._companies.pop(str(document_key), None)
+            else:
+                self._loaded_at = None
+
+    def peek(self, company_ids: List[str]) -> Tuple[Dict[str, dict], List[str]]:
+        """Returns cached companies and the ids that need a database lookup, without I/O."""
+        with self._lock:
+            found = {i: self._companies[i] for i in company_ids if i in self._companies}
+        return found, [i for i in company_ids if i not in found]
+
+    def get_many(self, company_ids: List[str]) -> Dict[str, dict]:
+        if self.stale:
+            self.refresh()
+        found, missing = self.peek(company_ids)
+        object_ids = [ObjectId(i) for i in missing if ObjectId.is_valid(i)]
+        if object_ids:
+            for company in self.collection.find({"_id": {"$in": object_ids}}, self.projection):
+                company_id = str(company["_id"])
+                found[company_id] = company
+                with self._lock:
+                    self._companies[company_id] = company
+        return found
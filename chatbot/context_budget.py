@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+from typing import List, Optional
+
+from langchain_core.messages import AnyMessage, HumanMessage, ToolMessage
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ["title", "realEstateName", "name", "price", "listingType", "bedrooms", "companyId"]
+
+
+def estimate_tokens(message) -> int:
+    # Roughly four characters per token plus a small per-message overhead
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += json.dumps(tool_calls, default=str)
+    return len(content) // 4 + 4
+
+
+def _address(metadata: dict) -> str:
+    address = metadata.get("address")
+    if isinstance(address, dict):
+        return ", ".join(str(address[k]) for k in ("subcity", "city", "specificLocation") if address.get(k))
+    return str(address) if address else ""
+
+
+def summarize_tool_result(message: ToolMessage, max_items: int = 10) -> str:
+    """Collapses a ToolMessage payload to one short line per result."""
+    try:
+        results = json.loads(message.content)
+    except (TypeError, ValueError):
+        return str(message.content)[:300]
+    if not isinstance(results, list):
+        return str(results)[:300]
+    lines = []
+    for item in results[:max_items]:
+        if not isinstance(item, dict):
+            lines.append(str(item)[:120])
+            continue
+        metadata = item.get("metadata", item)
+        parts = [f"{field}: {metadata[field]}" for field in SUMMARY_FIELDS if metadata.get(field) not in (None, "")]
+        if _address(metadata):
+            parts.append(f"address: {_address(metadata)}")
+        if metadata.get("_id"):
+            parts.append(f"_id: {metadata['_id']}")
+        if not parts and item.get("text"):
+            parts.append(item["text"][:120])
+        lines.append("- " + "; ".join(parts))
+    return f"[Earlier {message.name} results, summarized: {len(results)} items]\n" + "\n".join(lines)
+
+
+def split_turns(messages: List[AnyMessage]) -> List[List[AnyMessage]]:
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+class ContextBudget:
+    """Shrinks the conversation history sent with each Gemini call.
+
+    The last ``keep_turns`` user turns are sent verbatim. ToolMessages of
+    older turns are replaced by compact summaries, and the oldest turns are
+    dropped until the estimated prompt size fits ``max_tokens``. The current
+    turn is always sent whole.
+    """
+
+    def __init__(self, keep_turns: int = 3, max_tokens: int = 12000):
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.calls = 0
+        self.estimated_tokens = 0
+        self.input_tokens = 0
+        self.last_estimated_tokens = 0
+        self._lock = threading.Lock()
+
+    def apply(self, messages: List[AnyMessage], system: str = "") -> List[AnyMessage]:
+        turns = split_turns(messages)
+        recent = turns[-self.keep_turns:] if self.keep_turns > 0 else turns[-1:]
+        older = turns[:len(turns) - len(recent)]
+        older = [
+            [
+                ToolMessage(tool_call_id=m.tool_call_id, name=m.name, content=summarize_tool_result(m))
+                if isinstance(m, ToolMessage) else m
+                for m in turn
+            ]
+            for turn in older
+        ]
+        turns = older + recent
+
+        system_tokens = len(system) // 4
+        sizes = [sum(estimate_tokens(m) for m in turn) for turn in turns]
+        total = system_tokens + sum(sizes)
+        while len(turns) > 1 and total > self.max_tokens:
+            total -= sizes.pop(0)
+            turns.pop(0)
+        if total > self.max_tokens:
+            logger.info("Current turn alone is ~%d tokens, above the %d token budget", total, self.max_tokens)
+
+        with self._lock:
+            self.calls += 1
+            self.estimated_tokens += total
+            self.last_estimated_tokens = total
+        logger.info("Gemini call: %d of %d messages, ~%d tokens", sum(len(t) for t in turns), len(messages), total)
+        return [m for turn in turns for m in turn]
+
+    def record_usage(self, message) -> Optional[int]:
+        """Records the prompt size Gemini reported for a response, if any."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        input_tokens = usage.get("input_tokens")
+        if input_tokens:
+            with self._lock:
+                self.input_tokens += input_tokens
+        return input_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "avg_estimated_tokens": self.estimated_tokens / self.calls if self.calls else 0.0,
+                "avg_input_tokens": self.input_tokens / self.calls if self.calls else 0.0,
+                "last_estimated_tokens": self.last_estimated_tokens,
+            }
@@ -0,0 +1,234 @@
+"""Query embedding backends: the PyTorch model or an int8-quantized ONNX export.
+
+``huggingface`` runs all-MiniLM-L6-v2 through sentence-transformers (fp32,
+full PyTorch). ``onnx`` runs the same model exported to ONNX with int8
+dynamically quantized weights on onnxruntime, with the Rust ``tokenizers``
+fast tokenizer and the model's mean pooling and normalization done in NumPy.
+
+Export the model once (e.g. at image build):
+
+    python embedding_backend.py export --dir /app/.cache/minilm-onnx-int8
+
+and check it against the reference model and the stored ``revoemb`` vectors
+before switching EMBEDDING_BACKEND=onnx:
+
+    python embedding_backend.py check --dir /app/.cache/minilm-onnx-int8
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_ONNX_DIR = "/app/.cache/minilm-onnx-int8"
+MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+MAX_LENGTH = 256  # max_seq_length of all-MiniLM-L6-v2
+
+# Queries for the agreement check; the tools mostly see property searches
+CHECK_QUERIES = [
+    "apartments for rent in Bole",
+    "3 bedroom villa with a garden for sale",
+    "cheap condominium in Yeka under 20000 birr",
+    "furnished 2 bedroom apartment near CMC",
+    "office space for rent in Kirkos",
+    "land for sale in Lemi Kura",
+    "house with parking and security in Gullele",
+    "luxury villa in Bole with a swimming pool",
+    "studio apartment for students near Arat Kilo",
+    "real estate companies in Addis Ababa",
+    "contact details of Noah Real Estate",
+    "how do I list my property on Revoestate",
+]
+
+
+class OnnxEmbeddings(Embeddings):
+    """all-MiniLM-L6-v2 on onnxruntime; a drop-in for HuggingFaceEmbeddings."""
+
+    def __init__(self, model_dir: str = DEFAULT_ONNX_DIR, threads: Optional[int] = None, batch_size: int = 32):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(MAX_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+            mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+            inputs = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                inputs["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, inputs)[0]
+            # Mean pooling over real tokens, then L2 normalization, as in the model's pipeline
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            vectors.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        return np.concatenate(vectors).astype(np.float32) if vectors else np.zeros((0, 384), dtype=np.float32)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+
+def create_embeddings(backend: str = "huggingface", onnx_dir: str = DEFAULT_ONNX_DIR, threads: Optional[int] = None) -> Embeddings:
+    """Builds the query embedding model selected by ``backend`` ("huggingface" or "onnx")."""
+    if backend == "onnx":
+        model = OnnxEmbeddings(onnx_dir, threads=threads)
+        logger.info("Loaded int8 ONNX embedding model from %s", onnx_dir)
+        return model
+    if backend == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        logger.info("Loaded embedding model %s", EMBEDDING_MODEL_NAME)
+        return model
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def export_onnx(model_dir: str, keep_fp32: bool = False):
+    """Downloads the model's published fp32 ONNX export and quantizes its weights to int8.
+
+    Uses only huggingface_hub and onnxruntime, so no PyTorch is needed.
+    """
+    import shutil
+    from huggingface_hub import hf_hub_download
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(model_dir, exist_ok=True)
+    repo = f"sentence-transformers/{EMBEDDING_MODEL_NAME}"
+    fp32_path = os.path.join(model_dir, "model_fp32.onnx")
+    shutil.copyfile(hf_hub_download(repo, "onnx/model.onnx"), fp32_path)
+    shutil.copyfile(hf_hub_download(repo, TOKENIZER_FILE), os.path.join(model_dir, TOKENIZER_FILE))
+    quantize_dynamic(fp32_path, os.path.join(model_dir, MODEL_FILE), weight_type=QuantType.QInt8)
+    if not keep_fp32:
+        os.remove(fp32_path)
+    with open(os.path.join(model_dir, "export.json"), "w") as f:
+        json.dump({"model": repo, "max_length": MAX_LENGTH, "weights": "int8"}, f)
+    size = os.path.getsize(os.path.join(model_dir, MODEL_FILE)) / 2**20
+    logger.info("Exported %s to %s (%.1f MiB)", repo, model_dir, size)
+
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return (a * b).sum(axis=1)
+
+
+def _top_k(queries: np.ndarray, documents: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ documents.T), axis=1)[:, :k]
+
+
+def check_agreement(candidate: Embeddings, reference: Optional[Embeddings], documents: List[dict],
+                    queries: List[str] = CHECK_QUERIES, k: int = 10) -> dict:
+    """Compares ``candidate`` with the stored vectors and the reference model.
+
+    - documents: cosine between the candidate's embedding of each document's
+      text and its stored ``revoemb``
+    - queries: cosine between candidate and reference query vectors (needs
+      the reference model)
+    - top_k_overlap: share of the top ``k`` stored documents per query that
+      the candidate finds too, with reference query vectors as ground truth
+      (without the reference model, the stored vectors rank the documents
+      for both sides: candidate queries against stored vectors vs. against
+      the candidate's own document vectors)
+    """
+    from ingest import document_to_text
+
+    stored = np.asarray([d["revoemb"] for d in documents], dtype=np.float32)
+    texts = [document_to_text(d, is_company=d.get("_collection") == "companies") for d in documents]
+    start = time.perf_counter()
+    candidate_docs = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    candidate_queries = np.asarray([candidate.embed_query(q) for q in queries], dtype=np.float32)
+    encode_ms = (time.perf_counter() - start) * 1000 / (len(texts) + len(queries))
+    doc_cosines = _cosines(candidate_docs, stored)
+    report = {
+        "documents": len(documents),
+        "document_cosine_mean": round(float(doc_cosines.mean()), 4),
+        "document_cosine_min": round(float(doc_cosines.min()), 4),
+        "candidate_encode_ms": round(encode_ms, 2),
+    }
+    k = min(k, len(documents))
+    found = _top_k(candidate_queries, stored, k)
+    if reference is not None:
+        start = time.perf_counter()
+        reference_queries = np.asarray([reference.embed_query(q) for q in queries], dtype=np.float32)
+        report["reference_encode_ms"] = round((time.perf_counter() - start) * 1000 / len(queries), 2)
+        query_cosines = _cosines(candidate_queries, reference_queries)
+        report["query_cosine_mean"] = round(float(query_cosines.mean()), 4)
+        report["query_cosine_min"] = round(float(query_cosines.min()), 4)
+        expected = _top_k(reference_queries, stored, k)
+    else:
+        expected = _top_k(candidate_queries, candidate_docs, k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(found, expected)]
+    report["top_k"] = k
+    report["top_k_overlap_mean"] = round(float(np.mean(overlap)), 4)
+    report["top_k_overlap_min"] = round(float(np.min(overlap)), 4)
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export and check the int8 ONNX query encoder")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="download and quantize the ONNX export of all-MiniLM-L6-v2")
+    export.add_argument("--dir", default=os.getenv("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR))
+    export.add_argument("--keep-fp32", action="store_true")
+    check = commands.add_parser("check", help="compare the ONNX model with the stored vectors")
+    check.add_argument("--dir", default=os.getenv("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR))
+    check.add_argument("--sample", type=int, default=500, help="stored documents to compare per collection")
+    check.add_argument("--k", type=int, default=10)
+    check.add_argument("--min-cosine", type=float, default=0.98)
+    check.add_argument("--min-overlap", type=float, default=0.9, help="minimum mean top-k overlap")
+    check.add_argument("--no-reference", action="store_true", help="do not load the PyTorch reference model")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("HF_HOME", "/app/.cache")
+    if args.command == "export":
+        export_onnx(args.dir, keep_fp32=args.keep_fp32)
+        return
+
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MongoURI"))["revostate"]
+    documents = []
+    for name in ("properties", "companies"):
+        for doc in db[name].aggregate([{"$match": {"revoemb": {"$exists": True}}}, {"$sample": {"size": args.sample}}]):
+            doc["_collection"] = name
+            documents.append(doc)
+    if not documents:
+        sys.exit("No documents with stored revoemb vectors")
+    reference = None if args.no_reference else create_embeddings("huggingface")
+    report = check_agreement(OnnxEmbeddings(args.dir), reference, documents, k=args.k)
+    print(json.dumps(report, indent=2))
+    cosine = report.get("query_cosine_mean", report["document_cosine_mean"])
+    if cosine < args.min_cosine or report["top_k_overlap_mean"] < args.min_overlap:
+        sys.exit(f"ONNX embeddings disagree with the reference (cosine {cosine}, top-k overlap {report['top_k_overlap_mean']})")
+    logger.info("ONNX embeddings agree with the reference")
+
+
+if __name__ == "__main__":
+    main()
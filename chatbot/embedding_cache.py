@@ -0,0 +1,115 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    # all-MiniLM-L6-v2 uses an uncased tokenizer, so case and repeated
+    # whitespace do not change the embedding.
+    return " ".join(query.lower().split())
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of query embeddings with TTL expiry.
+
+    Keys are normalized query texts. When ``path`` is set, entries are loaded
+    from that ``.npz`` file on startup and written back on interpreter exit.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 86400, path: Optional[str] = None, model_name: str = ""):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (created_at, embedding)
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, query: str) -> Optional[List[float]]:
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query: str, embedding: List[float], created_at: Optional[float] = None):
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (created_at or time.time(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model_name"]) != self.model_name:
+                    logger.info("Embedding cache %s was built for another model, ignoring it", self.path)
+                    return
+                now = time.time()
+                # Entries are stored oldest-used first, so re-inserting keeps the LRU order
+                for key, created_at, embedding in zip(data["keys"], data["created_at"], data["embeddings"]):
+                    if now - created_at <= self.ttl:
+                        self.put(str(key), embedding.tolist(), created_at=float(created_at))
+            logger.info("Loaded %d cached query embeddings from %s", len(self._entries), self.path)
+        except Exception as e:
+            logger.error("Embedding cache load error: %s", str(e))
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            items = list(self._entries.items())
+        if not items:
+            return
+        try:
+            # Write to a temporary file first so concurrent workers never leave a partial file
+            tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_path,
+                model_name=np.array(self.model_name),
+                keys=np.array([key for key, _ in items]),
+                created_at=np.array([created_at for _, (created_at, _) in items], dtype=np.float64),
+                embeddings=np.array([embedding for _, (_, embedding) in items], dtype=np.float32),
+            )
+            os.replace(tmp_path, self.path)
+            logger.info("Saved %d cached query embeddings to %s", len(items), self.path)
+        except Exception as e:
+            logger.error("Embedding cache save error: %s", str(e))
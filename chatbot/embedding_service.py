@@ -0,0 +1,248 @@
+"""Shared query-embedding service.
+
+One process per container loads all-MiniLM-L6-v2 (PyTorch, or int8 ONNX with
+EMBEDDING_BACKEND=onnx) and serves encode requests
+over a Unix socket; concurrent requests from all gunicorn workers are grouped
+into micro-batches. Started by gunicorn.conf.py, or manually with
+
+    python embedding_service.py --socket /tmp/revo-embed.sock
+
+Wire format (both directions length-prefixed, big-endian):
+    request:  uint8 kind, then
+              kind 0 (query): uint32 length + utf-8 text
+              kind 1 (batch): uint32 count + count * (uint32 length + utf-8 text)
+    response: uint8 status (0 ok, 1 error) + uint32 length + payload,
+              where payload is the float32 vector bytes (one row per text of
+              a batch, in order) or a utf-8 error message
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import struct
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/revo-embed.sock"
+STATUS_OK = 0
+STATUS_ERROR = 1
+KIND_QUERY = 0
+KIND_BATCH = 1
+
+
+class MicroBatcher:
+    """Collects concurrent encode requests and runs them as one batch.
+
+    A batch is flushed when it reaches ``max_batch_size`` or when the oldest
+    request has waited ``max_wait_ms``. Encoding runs in a single thread, so
+    the next batch fills up while the current one is being encoded.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Queues every text at once, so a batch request shares micro-batches with other callers."""
+        return np.stack(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.embed_documents(texts), dtype=np.float32)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Identical queries in one batch are encoded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = await loop.run_in_executor(None, self.encode, texts)
+            except Exception as e:
+                logger.error("Batch encode error: %s", str(e))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            rows = {text: vectors[i] for i, text in enumerate(texts)}
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(rows[text])
+            self.batches += 1
+            self.requests += len(batch)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    (length,) = struct.unpack(">I", await reader.readexactly(4))
+    return await reader.readexactly(length)
+
+
+async def read_request(reader: asyncio.StreamReader) -> List[str]:
+    """Reads one request; returns its texts (a single one for a query)."""
+    (kind,) = struct.unpack(">B", await reader.readexactly(1))
+    if kind == KIND_QUERY:
+        return [(await read_frame(reader)).decode("utf-8")]
+    (count,) = struct.unpack(">I", await reader.readexactly(4))
+    return [(await read_frame(reader)).decode("utf-8") for _ in range(count)]
+
+
+def encode_request(texts: List[str], batch: bool = False) -> bytes:
+    frames = b"".join(struct.pack(">I", len(data)) + data for data in (text.encode("utf-8") for text in texts))
+    if batch:
+        return struct.pack(">BI", KIND_BATCH, len(texts)) + frames
+    return struct.pack(">B", KIND_QUERY) + frames
+
+
+def encode_response(status: int, payload: bytes) -> bytes:
+    return struct.pack(">BI", status, len(payload)) + payload
+
+
+def decode_vector(status: int, payload: bytes) -> List[float]:
+    if status != STATUS_OK:
+        raise RuntimeError(f"Embedding service error: {payload.decode('utf-8', 'replace')}")
+    return np.frombuffer(payload, dtype=np.float32).tolist()
+
+
+def decode_vectors(status: int, payload: bytes, count: int) -> List[List[float]]:
+    if status != STATUS_OK:
+        raise RuntimeError(f"Embedding service error: {payload.decode('utf-8', 'replace')}")
+    return np.frombuffer(payload, dtype=np.float32).reshape(count, -1).tolist()
+
+
+async def serve(socket_path: str, batcher: MicroBatcher):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    texts = await read_request(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    vectors = await batcher.embed_many(texts)
+                    writer.write(encode_response(STATUS_OK, vectors.tobytes()))
+                except Exception as e:
+                    writer.write(encode_response(STATUS_ERROR, str(e).encode("utf-8")))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle, path=socket_path)
+    logger.info("Embedding service listening on %s", socket_path)
+    async with server:
+        await asyncio.gather(server.serve_forever(), batcher.run())
+
+
+class EmbeddingClient(Embeddings):
+    """Client for the shared embedding service.
+
+    Each call opens a short-lived Unix socket connection, so any number of
+    concurrent requests can be in flight and batched together by the service.
+    A list of documents (a re-embedding batch) is sent as one batch request.
+    Connections are retried for ``connect_timeout`` seconds while the service
+    is still loading its model.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, connect_timeout: float = 60.0):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+
+    async def _connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return await asyncio.open_unix_connection(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+    async def _arequest(self, request: bytes):
+        reader, writer = await self._connect()
+        try:
+            writer.write(request)
+            await writer.drain()
+            status, length = struct.unpack(">BI", await reader.readexactly(5))
+            return status, await reader.readexactly(length)
+        finally:
+            writer.close()
+
+    def _request(self, request: bytes):
+        deadline = time.monotonic() + self.connect_timeout
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            while True:
+                try:
+                    sock.connect(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+            sock.sendall(request)
+            stream = sock.makefile("rb")
+            status, length = struct.unpack(">BI", stream.read(5))
+            return status, stream.read(length)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return decode_vector(*await self._arequest(encode_request([text])))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return decode_vectors(*await self._arequest(encode_request(texts, batch=True)), len(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return decode_vector(*self._request(encode_request([text])))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return decode_vectors(*self._request(encode_request(texts, batch=True)), len(texts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared micro-batching embedding service")
+    parser.add_argument("--socket", default=os.getenv("EMBEDDING_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--max-batch-size", type=int, default=int(os.getenv("EMBEDDING_MAX_BATCH", "32")))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")))
+    args = parser.parse_args()
+
+    os.environ.setdefault("HF_HOME", "/app/.cache")
+    from embedding_backend import create_embeddings
+    model = create_embeddings(
+        os.getenv("EMBEDDING_BACKEND", "huggingface"),
+        onnx_dir=os.getenv("ONNX_MODEL_DIR", "/app/.cache/minilm-onnx-int8"),
+        threads=int(os.getenv("ONNX_THREADS", "0")) or None
+    )
+    asyncio.run(serve(args.socket, MicroBatcher(model, args.max_batch_size, args.max_wait_ms)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Locations in Addis Ababa for nearby-property search.
+
+Properties store their position as a GeoJSON point in ``address.geoPoint``
+(2dsphere indexed). Older listings only have ``address.coordinates`` as
+``{"lat", "lng"}``, which 2dsphere cannot index in that field order, so the
+setup command copies them into ``address.geoPoint``:
+
+    python geo.py setup
+
+Subcity centroids and landmarks anchor queries like "near CMC"; the subcity
+adjacency table widens searches for listings without coordinates.
+"""
+import argparse
+import logging
+import math
+import os
+import re
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import GEOSPHERE, UpdateOne
+
+from query_parser import parse_property_query
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GEO_FIELD = "address.geoPoint"
+
+# Approximate centre of each subcity as (longitude, latitude)
+SUBCITY_CENTROIDS: Dict[str, Tuple[float, float]] = {
+    "Addis Ketema": (38.7350, 9.0350),
+    "Akaky Kaliti": (38.7800, 8.8900),
+    "Arada": (38.7520, 9.0350),
+    "Bole": (38.8000, 8.9900),
+    "Gullele": (38.7350, 9.0700),
+    "Kirkos": (38.7600, 9.0100),
+    "Kolfe Keranio": (38.6900, 9.0200),
+    "Lemi Kura": (38.8500, 9.0300),
+    "Lideta": (38.7350, 9.0100),
+    "Nifas Silk-Lafto": (38.7400, 8.9600),
+    "Yeka": (38.8100, 9.0400),
+}
+
+# Subcities sharing a border
+SUBCITY_ADJACENCY: Dict[str, List[str]] = {
+    "Addis Ketema": ["Arada", "Gullele", "Kolfe Keranio", "Lideta"],
+    "Akaky Kaliti": ["Bole", "Nifas Silk-Lafto"],
+    "Arada": ["Addis Ketema", "Gullele", "Kirkos", "Lideta", "Yeka"],
+    "Bole": ["Akaky Kaliti", "Kirkos", "Lemi Kura", "Nifas Silk-Lafto", "Yeka"],
+    "Gullele": ["Addis Ketema", "Arada", "Kolfe Keranio", "Yeka"],
+    "Kirkos": ["Arada", "Bole", "Lideta", "Nifas Silk-Lafto", "Yeka"],
+    "Kolfe Keranio": ["Addis Ketema", "Gullele", "Lideta", "Nifas Silk-Lafto"],
+    "Lemi Kura": ["Bole", "Yeka"],
+    "Lideta": ["Addis Ketema", "Arada", "Kirkos", "Kolfe Keranio", "Nifas Silk-Lafto"],
+    "Nifas Silk-Lafto": ["Akaky Kaliti", "Bole", "Kirkos", "Kolfe Keranio", "Lideta"],
+    "Yeka": ["Arada", "Bole", "Gullele", "Kirkos", "Lemi Kura"],
+}
+
+# Well-known neighbourhoods as (longitude, latitude, subcity)
+LANDMARKS: Dict[str, Tuple[float, float, str]] = {
+    "cmc": (38.8460, 9.0210, "Yeka"),
+    "megenagna": (38.8020, 9.0200, "Yeka"),
+    "ayat": (38.8800, 9.0300, "Yeka"),
+    "summit": (38.8500, 9.0000, "Bole"),
+    "gerji": (38.8100, 8.9950, "Bole"),
+    "bole medhanialem": (38.7880, 8.9950, "Bole"),
+    "kazanchis": (38.7680, 9.0180, "Kirkos"),
+    "mexico": (38.7450, 9.0100, "Kirkos"),
+    "piassa": (38.7520, 9.0350, "Arada"),
+    "arat kilo": (38.7630, 9.0330, "Arada"),
+    "merkato": (38.7400, 9.0350, "Addis Ketema"),
+    "sarbet": (38.7350, 8.9950, "Nifas Silk-Lafto"),
+    "lebu": (38.7250, 8.9550, "Nifas Silk-Lafto"),
+    "jemo": (38.7100, 8.9600, "Kolfe Keranio"),
+}
+
+# Search radii tried in order, in kilometres
+RADII_KM = (1.5, 3.0, 5.0, 8.0)
+
+# "within 2 km", "500 m from": distances, which must not be read as prices
+# (a bare "m" only before from/of/away/around: "under 5m" is a price)
+_DISTANCE = re.compile(
+    r"\b(?:(?:within|under|less than|up to|at most)\s+)?(\d+(?:\.\d+)?)\s*(km|kilomet(?:er|re)s?|met(?:er|re)s?|m(?=\s+(?:from|of|away|around)\b))\b", re.I
+)
+
+
+def find_anchor(query: str, subcity: Optional[str] = None) -> Optional[Tuple[str, Tuple[float, float], str]]:
+    """Returns (place name, (lng, lat), subcity) for the landmark or subcity in a query."""
+    lowered = query.lower()
+    for name, (lng, lat, landmark_subcity) in LANDMARKS.items():
+        if re.search(r"\b" + re.escape(name) + r"\b", lowered):
+            return name.title() if len(name) > 3 else name.upper(), (lng, lat), landmark_subcity
+    subcity = subcity if subcity in SUBCITY_CENTROIDS else parse_property_query(query).get("subcity")
+    if subcity:
+        return subcity, SUBCITY_CENTROIDS[subcity], subcity
+    return None
+
+
+def split_distance(query: str) -> Tuple[str, Optional[float]]:
+    """Removes distances from a query; returns the rest and the first distance in kilometres."""
+    km = None
+    match = _DISTANCE.search(query)
+    if match:
+        value, unit = float(match.group(1)), match.group(2).lower()
+        km = value if unit.startswith("k") else value / 1000
+    return _DISTANCE.sub(" ", query), km
+
+
+def distance_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance between two (lng, lat) points."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def ring_label(distance_m: float) -> str:
+    for radius in RADII_KM:
+        if distance_m <= radius * 1000:
+            return f"within {radius:g} km"
+    return f"{distance_m / 1000:.1f} km away"
+
+
+def subcity_rings(subcity: str, max_hops: int = 2) -> List[List[str]]:
+    """Subcities grouped by the number of borders crossed from ``subcity``."""
+    hops = {subcity: 0}
+    queue = deque([subcity])
+    while queue:
+        current = queue.popleft()
+        if hops[current] == max_hops:
+            continue
+        for neighbour in SUBCITY_ADJACENCY.get(current, []):
+            if neighbour not in hops:
+                hops[neighbour] = hops[current] + 1
+                queue.append(neighbour)
+    return [sorted(s for s, h in hops.items() if h == hop) for hop in range(max_hops + 1)]
+
+
+def geo_point(address: dict) -> Optional[dict]:
+    """GeoJSON point for an address's ``{"lat", "lng"}`` coordinates, if they look valid."""
+    coordinates = (address or {}).get("coordinates")
+    if not isinstance(coordinates, dict):
+        return None
+    try:
+        lat, lng = float(coordinates["lat"]), float(coordinates["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def ensure_geo_index(collection):
+    collection.create_index([(GEO_FIELD, GEOSPHERE)], name="geo_point_2dsphere")
+    logger.info("Ensured 2dsphere index on %s.%s", collection.name, GEO_FIELD)
+
+
+def backfill_geo_points(collection, batch_size: int = 500) -> int:
+    """Copies ``address.coordinates`` into ``address.geoPoint`` where it is missing."""
+    updates, written = [], 0
+    query = {GEO_FIELD: {"$exists": False}, "address.coordinates": {"$exists": True}}
+    for doc in collection.find(query, {"address": 1}):
+        point = geo_point(doc.get("address"))
+        if point is None:
+            continue
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {GEO_FIELD: point}}))
+        if len(updates) == batch_size:
+            written += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        written += collection.bulk_write(updates, ordered=False).modified_count
+    logger.info("Backfilled %d geo points in %s", written, collection.name)
+    return written
+
+
+def main(argv: Optional[List[str]] = None):
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Geo index and coordinates for nearby-property search")
+    parser.add_argument("command", choices=["setup"], help="backfill address.geoPoint and create the 2dsphere index")
+    parser.parse_args(argv)
+
+    load_dotenv()
+    properties = MongoClient(os.getenv("MongoURI"))["revostate"]["properties"]
+    backfill_geo_points(properties)
+    ensure_geo_index(properties)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import gc
+import os
+import subprocess
+import sys
+
+# Run one shared embedding service per container instead of loading the
+# model in every worker. Set EMBEDDING_SERVICE=off to load it per worker.
+EMBEDDING_SERVICE = os.getenv("EMBEDDING_SERVICE", "on") != "off"
+if EMBEDDING_SERVICE:
+    os.environ.setdefault("EMBEDDING_SOCKET", "/tmp/revo-embed.sock")
+
+# Re-embed changed properties and companies in a background process (see
+# reembed_worker.py). Every worker consumes the change streams and writes the
+# vectors, so exactly one should run: set REEMBED_WORKER=on in a single
+# container, or run reembed_worker.py as its own one-replica deployment.
+REEMBED_WORKER = os.getenv("REEMBED_WORKER", "off") == "on"
+
+# Import the app once in the master and fork the workers from it, so imported
+# modules (and the embedding model, when it is loaded per worker) are shared
+# copy-on-write. Importing does no I/O; connections, the checkpointer and the
+# Gemini client are created in each worker. Set GUNICORN_PRELOAD=off to
+# import the app in every worker instead.
+preload_app = os.getenv("GUNICORN_PRELOAD", "on") != "off"
+
+embedding_process = None
+reembed_process = None
+
+
+def on_starting(server):
+    global embedding_process, reembed_process
+    if EMBEDDING_SERVICE:
+        embedding_process = subprocess.Popen(
+            [sys.executable, "embedding_service.py", "--socket", os.environ["EMBEDDING_SOCKET"]],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        server.log.info("Started embedding service (pid %s)", embedding_process.pid)
+    if REEMBED_WORKER:
+        reembed_process = subprocess.Popen(
+            [sys.executable, "reembed_worker.py"],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        server.log.info("Started re-embedding worker (pid %s)", reembed_process.pid)
+
+
+def pre_fork(server, worker):
+    if preload_app and not EMBEDDING_SERVICE:
+        import tool
+        tool.get_embedmodel()
+    # Keep the garbage collector from touching (and so copying) the
+    # master's objects in every worker
+    gc.freeze()
+
+
+def on_exit(server):
+    for process in (reembed_process, embedding_process):
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
@@ -0,0 +1,176 @@
+"""Bulk, incremental embedding of the properties and companies collections.
+
+Documents are streamed in ``_id`` order and encoded in batches, and the
+vectors are written with one unordered ``bulk_write`` per batch. Encoding
+the next batch overlaps with writing the previous one. Each vector is stored
+with a hash of its source text (``revoemb_hash``), so unchanged documents are
+skipped. Progress is checkpointed in the ``ingest_state`` collection, and an
+interrupted run resumes after the last written batch.
+
+    python ingest.py [properties companies] [--batch-size 256] [--force] [--restart]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+HASH_FIELD = "revoemb_hash"
+
+# Fields read by document_to_text, per collection
+TEXT_FIELDS = {
+    "properties": ["title", "description", "price", "area", "landArea", "listingType", "amenities", "address"],
+    "companies": ["realEstateName", "description", "address"],
+}
+
+
+def _address_parts(address) -> List[str]:
+    if isinstance(address, dict):
+        return [address[field] for field in ["region", "city", "specificLocation"] if address.get(field)]
+    if isinstance(address, str):
+        return [address]
+    return []
+
+
+def document_to_text(doc: dict, is_company: bool = False) -> str:
+    """Convert specified document fields to a text string for embedding."""
+    parts = []
+    if is_company:
+        if doc.get('realEstateName'):
+            parts.append(doc['realEstateName'])
+        if doc.get('description'):
+            parts.append(doc['description'])
+    else:
+        if doc.get('title'):
+            parts.append(doc['title'])
+        if doc.get('description'):
+            parts.append(doc['description'])
+        for field in ['price', 'area', 'landArea']:
+            if doc.get(field) is not None:
+                parts.append(f"{field}: {doc[field]}")
+        if doc.get('listingType'):
+            parts.append(doc['listingType'])
+        if doc.get('amenities'):
+            parts.append(f"amenities: {', '.join(str(x) for x in doc['amenities'])}")
+    parts.extend(_address_parts(doc.get('address')))
+    text = ' '.join(str(part) for part in parts)
+    return f"search_document: {text}"
+
+
+def content_hash(text: str, model_name: str = EMBEDDING_MODEL_NAME) -> str:
+    # The model name is part of the hash so a model change re-embeds everything
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def pending_documents(docs: Iterable[dict], is_company: bool, force: bool = False):
+    """Yields (_id, text, hash) for documents whose embedding is missing or outdated."""
+    for doc in docs:
+        text = document_to_text(doc, is_company)
+        if text == "search_document: ":
+            continue
+        digest = content_hash(text)
+        if force or doc.get(HASH_FIELD) != digest:
+            yield doc["_id"], text, digest
+
+
+def embedding_updates(model, pending: List[tuple]) -> List[UpdateOne]:
+    vectors = model.embed_documents([text for _, text, _ in pending])
+    return [
+        UpdateOne({"_id": _id}, {"$set": {"revoemb": vector, HASH_FIELD: digest}})
+        for (_id, _, digest), vector in zip(pending, vectors)
+    ]
+
+
+class Ingestor:
+    """Re-embeds one collection in batches, resuming from its checkpoint."""
+
+    def __init__(self, db, model, batch_size: int = 256):
+        self.db = db
+        self.model = model
+        self.batch_size = batch_size
+        self.state = db["ingest_state"]
+
+    def _batches(self, collection, resume_after):
+        query = {"_id": {"$gt": resume_after}} if resume_after is not None else {}
+        projection = {field: 1 for field in TEXT_FIELDS[collection.name] + [HASH_FIELD]}
+        batch = []
+        for doc in collection.find(query, projection).sort("_id", 1).batch_size(self.batch_size):
+            batch.append(doc)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self, collection_name: str, force: bool = False, restart: bool = False) -> dict:
+        collection = self.db[collection_name]
+        is_company = collection_name == "companies"
+        if restart:
+            self.state.delete_one({"_id": collection_name})
+        state = self.state.find_one({"_id": collection_name}) or {}
+        resume_after = state.get("last_id")
+        if resume_after is not None:
+            logger.info("Resuming %s after _id %s", collection_name, resume_after)
+
+        stats = {"scanned": 0, "embedded": 0, "skipped": 0}
+        start = time.perf_counter()
+        writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-write")
+        pending_write = None
+        try:
+            for batch in self._batches(collection, resume_after):
+                pending = list(pending_documents(batch, is_company, force))
+                updates = embedding_updates(self.model, pending) if pending else []
+                if pending_write is not None:
+                    pending_write.result()
+                pending_write = writer.submit(self._write, collection, updates, batch[-1]["_id"])
+                stats["scanned"] += len(batch)
+                stats["embedded"] += len(updates)
+                stats["skipped"] += len(batch) - len(updates)
+                logger.info("%s: scanned %d, embedded %d, skipped %d", collection_name, stats["scanned"], stats["embedded"], stats["skipped"])
+            if pending_write is not None:
+                pending_write.result()
+        finally:
+            writer.shutdown(wait=True)
+        # A completed pass starts from the beginning next time
+        self.state.delete_one({"_id": collection_name})
+        stats["seconds"] = round(time.perf_counter() - start, 1)
+        logger.info("Finished %s: %s", collection_name, stats)
+        return stats
+
+    def _write(self, collection, updates: List[UpdateOne], last_id):
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+        self.state.update_one({"_id": collection.name}, {"$set": {"last_id": last_id}}, upsert=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    from dotenv import load_dotenv
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Embed properties and companies into the revoemb field")
+    parser.add_argument("collections", nargs="*", default=list(TEXT_FIELDS), choices=list(TEXT_FIELDS))
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--force", action="store_true", help="re-embed documents even if their text is unchanged")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    os.environ.setdefault("HF_HOME", "/app/.cache")
+    model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, encode_kwargs={"batch_size": 64})
+    ingestor = Ingestor(MongoClient(os.getenv("MongoURI"))["revostate"], model, batch_size=args.batch_size)
+    for name in args.collections:
+        ingestor.run(name, force=args.force, restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
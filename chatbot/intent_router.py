@@ -0,0 +1,130 @@
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Labeled example queries per tool. "none" collects queries that must go to
+# Gemini (greetings, identity, off-topic, follow-up style questions) so that
+# they do not end up closest to a tool.
+INTENT_EXEMPLARS: Dict[str, List[str]] = {
+    "properties_vector_search": [
+        "apartments for rent in Bole",
+        "houses for sale in Addis Ababa",
+        "3 bedroom villa with a garden",
+        "cheap condominium in Yeka",
+        "show me properties under 50000 birr per month",
+        "I am looking for a house for my family",
+        "luxury villa in Bole for sale",
+        "office space for rent in Kirkos",
+        "find me a 2 bedroom apartment in Kirkos",
+        "land for sale in Lemi Kura",
+        "furnished apartment with parking",
+        "what homes are available in Gullele",
+    ],
+    "nearby_properties_search": [
+        "apartments near CMC",
+        "houses close to Kazanchis",
+        "office space for rent near Megenagna",
+        "properties around Piassa",
+        "2 bedroom apartment near Summit",
+        "what is available close to Arat Kilo",
+    ],
+    "companies_vector_search": [
+        "real estate companies in Addis Ababa",
+        "tell me about Noah Real Estate",
+        "where is Ayat Real Estate located",
+        "contact details of a real estate agency",
+        "which real estate developers are in Bole",
+        "phone number of Gift Real Estate",
+        "list real estate agencies",
+        "best real estate company in Ethiopia",
+    ],
+    "revoestate_information": [
+        "what is Revoestate",
+        "how do I use this website",
+        "how can I list my property on Revoestate",
+        "what services does Revoestate offer",
+        "who founded this platform",
+        "how do I contact Revoestate support",
+        "does Revoestate offer virtual tours",
+        "is this platform free to use",
+    ],
+    "none": [
+        "hi",
+        "hello there",
+        "thank you",
+        "who are you",
+        "what is the weather today",
+        "tell me a joke",
+        "can you compare them",
+        "which one is cheaper",
+        "what is the capital of France",
+    ],
+}
+
+
+class IntentRouter:
+    """Embedding-similarity intent classifier for first-turn queries.
+
+    Each query is compared with the labeled exemplars (cosine similarity on
+    the same MiniLM embeddings the tools use). The best intent wins when its
+    similarity reaches ``threshold`` and beats the best other intent by
+    ``margin``; otherwise the query goes to Gemini as before.
+    """
+
+    def __init__(self, embed: Callable[[str], Awaitable[List[float]]], exemplars: Dict[str, List[str]] = INTENT_EXEMPLARS,
+                 threshold: float = 0.6, margin: float = 0.05):
+        self.embed = embed
+        self.exemplars = exemplars
+        self.threshold = threshold
+        self.margin = margin
+        self.labels: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.routed: Dict[str, int] = {}
+        self.fallthrough = 0
+
+    async def prepare(self):
+        if self.matrix is not None:
+            return
+        labels, vectors = [], []
+        for intent, queries in self.exemplars.items():
+            for query in queries:
+                labels.append(intent)
+                vectors.append(await self.embed(query))
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self.labels, self.matrix = labels, matrix
+        logger.info("Intent router ready with %d exemplars", len(labels))
+
+    async def classify(self, query: str) -> Tuple[Optional[str], float]:
+        """Returns the confident tool intent (or None) and its similarity."""
+        await self.prepare()
+        vector = np.asarray(await self.embed(query), dtype=np.float32)
+        similarities = self.matrix @ (vector / (np.linalg.norm(vector) or 1))
+        best: Dict[str, float] = {}
+        for label, similarity in zip(self.labels, similarities):
+            best[label] = max(best.get(label, -1.0), float(similarity))
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        intent, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if intent == "none" or score < self.threshold or score - runner_up < self.margin:
+            self.fallthrough += 1
+            return None, score
+        self.routed[intent] = self.routed.get(intent, 0) + 1
+        return intent, score
+
+    def tool_call(self, intent: str, query: str) -> dict:
+        return {"name": intent, "args": {"query": query}, "id": f"router-{uuid.uuid4().hex}", "type": "tool_call"}
+
+    def stats(self) -> dict:
+        total = sum(self.routed.values()) + self.fallthrough
+        return {
+            "routed": dict(self.routed),
+            "fallthrough": self.fallthrough,
+            "routed_rate": round(sum(self.routed.values()) / total, 3) if total else 0.0,
+        }
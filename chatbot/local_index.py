@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class InMemoryVectorIndex:
+    """Exact cosine search over a small collection held in a NumPy matrix.
+
+    Documents and their ``revoemb`` vectors are loaded into one contiguous,
+    L2-normalized float32 matrix, so top-k is a single matrix-vector product.
+    Scores use Atlas' cosine scale, ``(1 + cosine) / 2``, so results look the
+    same as ``$vectorSearch`` results. The index reloads after ``max_age``
+    seconds or after the collection changes; documents and matrix are swapped
+    in together, so a search never pairs one load's rows with another's.
+    """
+
+    def __init__(self, collection, fields: Sequence[str] = ("text",), vector_field: str = "revoemb", max_age: float = 3600):
+        self.collection = collection
+        self.fields = list(fields)
+        self.vector_field = vector_field
+        self.max_age = max_age
+        self._data: Optional[Tuple[List[dict], np.ndarray]] = None  # (documents, matrix)
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """True once vectors are loaded; an empty index is not loaded, so callers fall back to Atlas."""
+        data = self._data
+        return data is not None and len(data[0]) > 0
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+
+    def refresh(self):
+        with self._lock:
+            if not self.stale:
+                return
+            documents, vectors = [], []
+            projection = {"_id": 0, self.vector_field: 1, **{field: 1 for field in self.fields}}
+            for doc in self.collection.find({self.vector_field: {"$exists": True}}, projection):
+                vectors.append(doc.pop(self.vector_field))
+                documents.append(doc)
+            matrix = np.ascontiguousarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+            self._data = (documents, matrix)
+            self._loaded_at = time.monotonic()
+        logger.info("Loaded %d %s vectors into memory", len(documents), self.collection.name)
+
+    def invalidate(self, collection_name: str = "", change: Optional[dict] = None):
+        """CollectionWatcher callback."""
+        if not collection_name or collection_name == self.collection.name:
+            self._loaded_at = None
+
+    def search(self, query_vector: List[float], k: int = 5) -> List[dict]:
+        data = self._data
+        if data is None or not len(data[0]):
+            return []
+        documents, matrix = data
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        scores = matrix @ query
+        k = min(k, len(documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**documents[i], "score": float((1 + scores[i]) / 2)} for i in top]
@@ -1,8 +1,33 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+
+_import_started = time.perf_counter()
+from GeminiAgent import collection_watcher, readiness, warm_up
 from routes import router
+from metrics import metrics, request_timings, server_timing
+from serialization import JSONResponse
+
+logger = logging.getLogger(__name__)
+readiness["import_seconds"] = round(time.perf_counter() - _import_started, 3)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    collection_watcher.start()
+    metrics.start()
+    # Warm up in the background so the worker starts serving (and /healthz
+    # answers) immediately; /readyz reports when the warm-up is done
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    collection_watcher.stop()
+    metrics.stop()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,4 +37,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request stage timings in a Server-Timing header, for every request with
+# TIMING_HEADERS=on or for requests sending "X-Timing: 1"
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "off") == "on"
+
+async def record_request_latency(request: Request, call_next):
+    timings = {} if TIMING_HEADERS or request.headers.get("x-timing") == "1" else None
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    metrics.observe(getattr(route, "path", "other"), elapsed, "revo_request_seconds", "path")
+    if timings is not None:
+        response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    return response
+
+# With METRICS=off requests skip the middleware altogether
+if metrics.enabled:
+    app.middleware("http")(record_request_latency)
+
 app.include_router(router)  # Mount router without prefix
\ No newline at end of file
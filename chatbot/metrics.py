@@ -0,0 +1,239 @@
+"""Latency histograms and component stats in the Prometheus text format.
+
+Stages (graph nodes, embedding, vector search, serialization), tools and
+HTTP requests are recorded in per-process histograms. Every worker writes a
+snapshot to METRICS_DIR, and ``/metrics`` renders the snapshots of all live
+workers with a ``worker`` label, so a scrape sees the whole container
+whichever worker answers it. When a request enables timing, its stage
+durations are also collected for a ``Server-Timing`` header.
+
+METRICS=off turns instrumentation into no-ops: ``timed`` returns functions
+unchanged and ``timer`` returns a shared null context.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "revo_stage_seconds": "Latency of agent and data path stages.",
+    "revo_tool_seconds": "Latency of tool calls.",
+    "revo_request_seconds": "Latency of HTTP requests.",
+}
+
+# Stage durations of the current request when timing headers are enabled
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+_NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("metrics", "metric", "label", "value", "start")
+
+    def __init__(self, metrics, metric, label, value):
+        self.metrics, self.metric, self.label, self.value = metrics, metric, label, value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.value, time.perf_counter() - self.start, self.metric, self.label)
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True, directory: Optional[str] = None, interval: float = 15, buckets=BUCKETS):
+        self.enabled = enabled
+        self.directory = directory
+        self.interval = interval
+        self.buckets = buckets
+        # (metric, label, value) -> per-bucket counts (last one is +Inf), sum, count
+        self._histograms: Dict[Tuple[str, str, str], List[float]] = {}
+        self._collectors: Dict[str, list] = {}  # name -> [fn, every, last_time, last_result]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def observe(self, value: str, seconds: float, metric: str = "revo_stage_seconds", label: str = "stage"):
+        if not self.enabled:
+            return
+        key = (metric, label, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 3)
+            histogram[bisect_left(self.buckets, seconds)] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+        timings = request_timings.get()
+        if timings is not None:
+            timings[value] = timings.get(value, 0.0) + seconds
+
+    def timer(self, value: str, metric: str = "revo_stage_seconds", label: str = "stage"):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, metric, label, value)
+
+    def timed(self, value: str, metric: str = "revo_stage_seconds", label: str = "stage"):
+        """Decorator recording each call of a sync or async function."""
+        def decorator(fn):
+            if not self.enabled:
+                return fn
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        self.observe(value, time.perf_counter() - start, metric, label)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(value, time.perf_counter() - start, metric, label)
+            return wrapper
+        return decorator
+
+    def register_stats(self, name: str, fn: Callable[[], dict], every: float = 0):
+        """Exports the numeric values of ``fn()`` as ``revo_<name>_<key>`` gauges,
+        calling it at most once per ``every`` seconds."""
+        self._collectors[name] = [fn, every, None, {}]
+
+    def _collect_stats(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        collected = {}
+        for name, collector in list(self._collectors.items()):
+            fn, every, last_time, last_result = collector
+            if last_time is None or now - last_time >= every:
+                try:
+                    last_result = fn() or {}
+                except Exception as e:
+                    logger.error("Could not collect %s stats: %s", name, str(e))
+                collector[2], collector[3] = now, last_result
+            collected[name] = last_result
+        return collected
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = [[*key, list(counts)] for key, counts in self._histograms.items()]
+        return {"pid": os.getpid(), "time": time.time(), "histograms": histograms, "stats": self._collect_stats()}
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def write_snapshot(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f, default=str)
+        os.replace(path + ".tmp", path)
+
+    def _worker_snapshots(self) -> List[dict]:
+        snapshots = [self.snapshot()]
+        if not self.directory or not os.path.isdir(self.directory):
+            return snapshots
+        for entry in os.listdir(self.directory):
+            if not entry.endswith(".json") or entry == f"{os.getpid()}.json":
+                continue
+            path = os.path.join(self.directory, entry)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+                os.kill(snapshot["pid"], 0)
+            except (OSError, ValueError, KeyError):
+                # Exited worker or partial file
+                continue
+            if time.time() - snapshot.get("time", 0) <= self.interval * 4:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def render(self) -> str:
+        histograms: Dict[str, List[str]] = {}
+        gauges: Dict[str, List[str]] = {}
+        for snapshot in self._worker_snapshots():
+            worker = snapshot["pid"]
+            for metric, label, value, counts in snapshot["histograms"]:
+                labels = f'{label}="{value}",worker="{worker}"'
+                lines = histograms.setdefault(metric, [])
+                cumulative = 0
+                for bound, count in zip([*self.buckets, "+Inf"], counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum{{{labels}}} {counts[-2]}")
+                lines.append(f"{metric}_count{{{labels}}} {counts[-1]}")
+            for name, stats in snapshot["stats"].items():
+                for key, value in _flatten(stats):
+                    gauges.setdefault(f"revo_{name}_{key}", []).append(f'revo_{name}_{key}{{worker="{worker}"}} {value}')
+        output = []
+        for metric, lines in histograms.items():
+            output += [f"# HELP {metric} {HELP.get(metric, metric)}", f"# TYPE {metric} histogram", *lines]
+        for metric, lines in gauges.items():
+            output += [f"# TYPE {metric} gauge", *lines]
+        return "\n".join(output) + "\n"
+
+    def start(self):
+        """Writes this worker's snapshot every ``interval`` seconds."""
+        if not self.enabled or not self.directory or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.directory:
+            try:
+                os.remove(self._snapshot_path(os.getpid()))
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.error("Could not write metrics snapshot: %s", str(e))
+            self._stop.wait(self.interval)
+
+
+def _flatten(stats: dict, prefix: str = ""):
+    for key, value in stats.items():
+        name = f"{prefix}{key}".replace(".", "_").replace("-", "_")
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    return ", ".join([*entries, f"total;dur={total * 1000:.1f}"])
+
+
+metrics = Metrics(
+    enabled=os.getenv("METRICS", "on") != "off",
+    directory=os.getenv("METRICS_DIR", "/tmp/revo-metrics"),
+    interval=float(os.getenv("METRICS_INTERVAL_SECONDS", "15"))
+)
@@ -0,0 +1,77 @@
+from typing import List
+
+# Per-collection field selection for tool results sent to Gemini.
+# "summary" lists the fields returned by default, "exclude" the fields
+# dropped in detail mode; descriptions are truncated to the given lengths.
+PROJECTIONS = {
+    "properties": {
+        "summary": [
+            "title", "price", "currency", "listingType", "propertyType", "status",
+            "bedrooms", "bathrooms", "area", "landArea", "builtYear", "furnished",
+            "amenities", "address", "companyId",
+        ],
+        "exclude": ["revoemb", "revoemb_hash", "images", "panoramicImages", "__v", "userId", "purchaseId"],
+        "summary_description_chars": 300,
+        "detail_description_chars": 1500,
+    },
+    "companies": {
+        "summary": [
+            "realEstateName", "name", "email", "phone", "website", "address",
+            "socialMedia", "isVerified", "verificationStatus",
+        ],
+        "exclude": [
+            "revoemb", "revoemb_hash", "documentUrl", "imageUrl", "documents", "__v", "userId",
+            "admins", "employees", "verifiedBy", "subscription",
+        ],
+        "summary_description_chars": 400,
+        "detail_description_chars": 1500,
+    },
+}
+
+
+def _truncated(field: str, chars: int) -> dict:
+    # Only strings are cut; missing or non-string values pass through unchanged
+    return {
+        "$cond": [
+            {"$eq": [{"$type": f"${field}"}, "string"]},
+            {"$substrCP": [f"${field}", 0, chars]},
+            f"${field}",
+        ]
+    }
+
+
+VECTOR_SCORE = {"score": {"$meta": "vectorSearchScore"}}
+
+
+def project_stages(collection: str, detail: bool = False, computed: dict = VECTOR_SCORE) -> List[dict]:
+    """Aggregation stages that shape vector search hits for one collection.
+
+    Summary mode keeps only the configured fields; detail mode keeps every
+    field except the excluded ones. Both truncate ``description`` and add
+    the ``computed`` fields (the vector search score by default), so
+    selection happens inside MongoDB.
+    """
+    config = PROJECTIONS[collection]
+    chars = config["detail_description_chars"] if detail else config["summary_description_chars"]
+    if detail:
+        return [
+            {"$set": {"description": _truncated("description", chars), **computed}},
+            {"$unset": config["exclude"]},
+        ]
+    return [
+        {
+            "$project": {
+                **{field: 1 for field in config["summary"]},
+                "description": _truncated("description", chars),
+                **computed,
+            }
+        }
+    ]
+
+
+def compact_metadata(metadata: dict) -> dict:
+    """Drops empty values and the score, which the tool result already carries."""
+    return {
+        k: v for k, v in metadata.items()
+        if k != "score" and v is not None and v != "" and v != [] and v != {}
+    }
@@ -0,0 +1,145 @@
+import re
+from typing import Iterator, Optional, Tuple
+
+# Document paths of the filterable property fields (see search_indexes.py)
+FILTER_PATHS = {
+    "price": "price",
+    "bedrooms": "bedrooms",
+    "subcity": "address.city",
+    "listing_type": "listingType",
+}
+
+SUBCITIES = [
+    "Addis Ketema", "Akaky Kaliti", "Arada", "Bole", "Gullele", "Kirkos",
+    "Kolfe Keranio", "Lemi Kura", "Lideta", "Nifas Silk-Lafto", "Yeka",
+]
+_SUBCITY_ALIASES = {
+    "akaki kaliti": "Akaky Kaliti", "akaki": "Akaky Kaliti", "kolfe": "Kolfe Keranio",
+    "nifas silk": "Nifas Silk-Lafto", "nifas silk lafto": "Nifas Silk-Lafto", "gulele": "Gullele",
+    "lemi kurra": "Lemi Kura",
+}
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+# Amounts followed by an area, distance or room unit are not prices
+_AMOUNT = (r"(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|m|mil|million|b|billion)?\b"
+           r"(?!\s*(?:sq|m2|m²|square|bed|br\b|km\b|kilomet|m\b|met(?:er|re)|bath|floor|stor(?:e)?y))")
+_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mil": 1e6, "million": 1e6, "b": 1e9, "billion": 1e9}
+_CURRENCY = r"(?:etb|birr|usd|dollars?)\b"
+_BETWEEN = re.compile(r"\bbetween\s+" + _AMOUNT + r"\s*(?:etb|birr)?\s+(?:and|-|to)\s+" + _AMOUNT, re.I)
+# Groups: keyword, "$", amount, unit, currency
+_MAX_PRICE = re.compile(
+    r"\b(under|below|less than|cheaper than|max(?:imum)?|up to|at most|budget(?: of| is)?|within)\s+(\$\s*)?"
+    + _AMOUNT + r"(\s*" + _CURRENCY + r")?", re.I
+)
+# "within 2 km" and "max 3 bathrooms" are not budgets: these keywords need a
+# currency or a k/M unit to mean a price
+_AMBIGUOUS_MAX = ("max", "maximum", "within")
+_PRICE_UNITS = ("k", "thousand", "mil", "million", "b", "billion")
+_MIN_PRICE = re.compile(r"\b(?:above|over|more than|at least|min(?:imum)?|starting (?:at|from))\s+" + _AMOUNT, re.I)
+_BEDROOMS = re.compile(r"\b(\d+|" + "|".join(_NUMBER_WORDS) + r")[\s-]*(?:bed(?:room)?s?|br|bdr)\b", re.I)
+_RENT = re.compile(r"\b(?:for rent|to rent|rent(?:al|ing)?|lease|per month|monthly)\b", re.I)
+_SALE = re.compile(r"\b(?:for sale|to buy|buy(?:ing)?|purchase|on sale)\b", re.I)
+
+
+def _amount(number: str, unit: Optional[str]) -> float:
+    value = float(number.replace(",", ""))
+    return value * _MULTIPLIERS.get((unit or "").lower(), 1)
+
+
+def _max_price(query: str) -> Optional[float]:
+    for match in _MAX_PRICE.finditer(query):
+        keyword, dollar, number, unit, currency = match.groups()
+        priced = dollar or currency or unit == "M" or (unit or "").lower() in _PRICE_UNITS
+        if keyword.lower() in _AMBIGUOUS_MAX and not priced:
+            continue
+        return _amount(number, unit)
+    return None
+
+
+def parse_property_query(query: str) -> dict:
+    """Extracts price, bedroom, subcity and listing type constraints from a query.
+
+    Returns only the constraints found, e.g.
+    ``{"max_price": 80000.0, "bedrooms": 3, "subcity": "Bole"}``.
+    """
+    constraints = {}
+    if match := _BETWEEN.search(query):
+        first, first_unit, second, second_unit = match.group(1, 2, 3, 4)
+        # "between 5 and 10 million": the unit of the second amount applies to both
+        if not first_unit and float(first.replace(",", "")) <= float(second.replace(",", "")):
+            first_unit = second_unit
+        low, high = _amount(first, first_unit), _amount(second, second_unit)
+        constraints["min_price"], constraints["max_price"] = min(low, high), max(low, high)
+    else:
+        max_price = _max_price(query)
+        if max_price is not None:
+            constraints["max_price"] = max_price
+        if match := _MIN_PRICE.search(query):
+            constraints["min_price"] = _amount(*match.group(1, 2))
+
+    if match := _BEDROOMS.search(query):
+        count = match.group(1).lower()
+        constraints["bedrooms"] = int(_NUMBER_WORDS.get(count, count))
+
+    lowered = query.lower()
+    for alias, subcity in [*_SUBCITY_ALIASES.items(), *((s.lower(), s) for s in SUBCITIES)]:
+        if re.search(r"\b" + re.escape(alias) + r"\b", lowered):
+            constraints["subcity"] = subcity
+            break
+
+    if _RENT.search(query):
+        constraints["listing_type"] = "rent"
+    elif _SALE.search(query):
+        constraints["listing_type"] = "sale"
+    return constraints
+
+
+def build_filter(constraints: dict) -> Optional[dict]:
+    """Turns parsed constraints into an Atlas ``$vectorSearch`` pre-filter."""
+    clauses = []
+    price = {}
+    if "min_price" in constraints:
+        price["$gte"] = constraints["min_price"]
+    if "max_price" in constraints:
+        price["$lte"] = constraints["max_price"]
+    if price:
+        clauses.append({FILTER_PATHS["price"]: price})
+    if "bedrooms" in constraints:
+        clauses.append({FILTER_PATHS["bedrooms"]: constraints["bedrooms"]})
+    if "min_bedrooms" in constraints:
+        clauses.append({FILTER_PATHS["bedrooms"]: {"$gte": constraints["min_bedrooms"]}})
+    if "subcity" in constraints:
+        subcity = constraints["subcity"]
+        clauses.append({FILTER_PATHS["subcity"]: {"$in": [subcity, subcity.lower()]}})
+    if "listing_type" in constraints:
+        listing_type = constraints["listing_type"]
+        clauses.append({FILTER_PATHS["listing_type"]: {"$in": [listing_type, listing_type.capitalize()]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def relaxations(constraints: dict, price_slack: float = 0.25) -> Iterator[Tuple[str, dict]]:
+    """Yields progressively looser constraint sets, starting with the exact one.
+
+    Order: exact, price widened by ``price_slack``, bedrooms as a minimum,
+    without subcity, and finally no constraints at all.
+    """
+    current = dict(constraints)
+    yield "exact", dict(current)
+    if "max_price" in current or "min_price" in current:
+        if "max_price" in current:
+            current["max_price"] = current["max_price"] * (1 + price_slack)
+        if "min_price" in current:
+            current["min_price"] = current["min_price"] * (1 - price_slack)
+        yield f"price widened by {int(price_slack * 100)}%", dict(current)
+    if "bedrooms" in current:
+        current["min_bedrooms"] = current.pop("bedrooms")
+        yield "bedrooms as a minimum", dict(current)
+    if "subcity" in current:
+        current.pop("subcity")
+        yield "any subcity", dict(current)
+    if current:
+        yield "no filters", {}
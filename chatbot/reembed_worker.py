@@ -0,0 +1,239 @@
+"""Keeps ``revoemb`` vectors fresh as properties and companies change.
+
+Inserts, updates and replacements arrive from change streams through
+CollectionWatcher and are debounced per document, so a burst of edits to a
+listing causes one re-embed. Ready documents are embedded in batches with
+the same content-hash check as ingest.py, so only documents whose text
+changed are encoded and written. Without change streams the watcher polls,
+and each detected change triggers a sweep of documents with a newer
+``updatedAt`` (or no vector yet). A catch-up sweep also runs at startup.
+
+Lag (event time to vector written) and throughput are kept in stats() and
+saved to the ``ingest_state`` collection. Run a single instance per
+database: each instance processes every change.
+
+    python reembed_worker.py [--debounce 2] [--batch-size 64] [--poll-interval 30]
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo.errors import PyMongoError
+
+from collection_watcher import CollectionWatcher
+from ingest import EMBEDDING_MODEL_NAME, HASH_FIELD, TEXT_FIELDS, embedding_updates, pending_documents
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Fields written by the worker itself; updates touching only these are ignored
+OWN_FIELDS = {"revoemb", HASH_FIELD}
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    return time.time()
+
+
+def _event_time(change: dict) -> float:
+    if "wallTime" in change:
+        return _timestamp(change["wallTime"])
+    if "clusterTime" in change:
+        return float(change["clusterTime"].time)
+    return time.time()
+
+
+class ReembedWorker:
+    """Debounced, batched re-embedding driven by collection changes."""
+
+    def __init__(self, db, model, collections: List[str] = ["properties", "companies"],
+                 debounce: float = 2.0, batch_size: int = 64, poll_interval: float = 30.0):
+        self.db = db
+        self.model = model
+        self.collection_names = list(collections)
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.state = db["ingest_state"]
+        self.watcher = CollectionWatcher([db[name] for name in self.collection_names], poll_interval)
+        self.watcher.subscribe(self.on_change)
+        # collection -> {_id: (last event, monotonic seconds), (first event time, epoch seconds)}
+        self._pending: Dict[str, Dict] = {name: {} for name in self.collection_names}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"events": 0, "ignored": 0, "embedded": 0, "unchanged": 0, "batches": 0, "errors": 0,
+                       "lag_seconds_last": 0.0, "lag_seconds_max": 0.0, "lag_seconds_total": 0.0}
+
+    def start(self):
+        self._stop.clear()
+        for name in self.collection_names:
+            self.sweep(name)
+        self.watcher.start()
+        self._thread = threading.Thread(target=self._run, name="reembed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.watcher.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        for name in self.collection_names:
+            self.flush(name, force=True)
+        self._save_stats()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = sum(len(p) for p in self._pending.values())
+        processed = stats["embedded"] + stats["unchanged"]
+        stats["lag_seconds_avg"] = round(stats.pop("lag_seconds_total") / processed, 3) if processed else 0.0
+        return stats
+
+    def _enqueue(self, name: str, document_id, event_time: float):
+        with self._lock:
+            _, first_event = self._pending[name].get(document_id, (None, event_time))
+            self._pending[name][document_id] = (time.monotonic(), min(first_event, event_time))
+
+    def on_change(self, name: str, change: Optional[dict]):
+        """CollectionWatcher callback."""
+        if change is None:
+            self.sweep(name)
+            return
+        with self._lock:
+            self._stats["events"] += 1
+        operation = change.get("operationType")
+        description = change.get("updateDescription", {})
+        fields = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+        if operation not in ("insert", "update", "replace") or (operation == "update" and fields and fields <= OWN_FIELDS):
+            with self._lock:
+                self._stats["ignored"] += 1
+            return
+        self._enqueue(name, change["documentKey"]["_id"], _event_time(change))
+
+    def sweep(self, name: str):
+        """Queues documents updated since the last sweep or still missing a vector."""
+        state_id = f"reembed:{name}"
+        try:
+            since = (self.state.find_one({"_id": state_id}) or {}).get("since")
+            query = {"revoemb": {"$exists": False}}
+            if since is not None:
+                query = {"$or": [query, {"updatedAt": {"$gt": since}}]}
+            # The first sweep only backfills missing vectors; later sweeps measure
+            # lag from updatedAt
+            latest = since if since is not None else datetime.now(timezone.utc)
+            count = 0
+            for doc in self.db[name].find(query, {"updatedAt": 1}):
+                updated_at = doc.get("updatedAt")
+                self._enqueue(name, doc["_id"], _timestamp(updated_at) if since is not None else time.time())
+                if since is not None and isinstance(updated_at, datetime) and _timestamp(updated_at) > _timestamp(latest):
+                    latest = updated_at
+                count += 1
+            self.state.update_one({"_id": state_id}, {"$set": {"since": latest}}, upsert=True)
+            if count:
+                logger.info("Sweep queued %d %s documents", count, name)
+        except PyMongoError as e:
+            logger.error("Sweep error on %s: %s", name, str(e))
+
+    def flush(self, name: str, force: bool = False) -> int:
+        """Re-embeds one batch of debounced documents; returns the batch size."""
+        now = time.monotonic()
+        with self._lock:
+            pending = self._pending[name]
+            ready = [i for i, (last, _) in pending.items() if force or now - last >= self.debounce][:self.batch_size]
+            batch = {i: pending.pop(i) for i in ready}
+        if not batch:
+            return 0
+        collection = self.db[name]
+        try:
+            projection = {field: 1 for field in TEXT_FIELDS[name] + [HASH_FIELD]}
+            docs = list(collection.find({"_id": {"$in": list(batch)}}, projection))
+            updates = embedding_updates(self.model, list(pending_documents(docs, name == "companies")))
+            if updates:
+                collection.bulk_write(updates, ordered=False)
+        except Exception as e:
+            logger.error("Re-embedding error on %s: %s", name, str(e))
+            with self._lock:
+                self._stats["errors"] += 1
+                for i, (_, first_event) in batch.items():
+                    self._pending[name].setdefault(i, (time.monotonic(), first_event))
+            return 0
+        written = time.time()
+        lags = [written - first_event for _, first_event in batch.values()]
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["embedded"] += len(updates)
+            self._stats["unchanged"] += len(batch) - len(updates)
+            self._stats["lag_seconds_last"] = round(max(lags), 3)
+            self._stats["lag_seconds_max"] = round(max(self._stats["lag_seconds_max"], max(lags)), 3)
+            self._stats["lag_seconds_total"] += sum(lags)
+        logger.info("Re-embedded %d of %d changed %s documents, lag %.1f s", len(updates), len(batch), name, max(lags))
+        return len(batch)
+
+    def _save_stats(self):
+        try:
+            self.state.update_one(
+                {"_id": "reembed_worker"},
+                {"$set": {"stats": self.stats(), "updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        except PyMongoError as e:
+            logger.error("Could not save re-embedding stats: %s", str(e))
+
+    def _run(self):
+        while not self._stop.wait(min(self.debounce, 1.0)):
+            flushed = 0
+            for name in self.collection_names:
+                while self.flush(name):
+                    flushed += 1
+            if flushed:
+                self._save_stats()
+
+
+def main():
+    from dotenv import load_dotenv
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from pymongo import MongoClient
+
+    from embedding_service import EmbeddingClient
+
+    parser = argparse.ArgumentParser(description="Re-embed properties and companies as they change")
+    parser.add_argument("--debounce", type=float, default=float(os.getenv("REEMBED_DEBOUNCE_SECONDS", "2")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("REEMBED_BATCH_SIZE", "64")))
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("WATCH_POLL_SECONDS", "30")))
+    args = parser.parse_args()
+
+    load_dotenv()
+    os.environ.setdefault("HF_HOME", "/app/.cache")
+    # Stored vectors always come from the reference model, like ingest.py: the
+    # content hash names only the model, so an ONNX vector would never be
+    # replaced when the backend changes back. The shared embedding service is
+    # used when it runs that model; batches are sent to it in one request.
+    if os.getenv("EMBEDDING_SOCKET") and os.getenv("EMBEDDING_BACKEND", "huggingface") == "huggingface":
+        model = EmbeddingClient(os.environ["EMBEDDING_SOCKET"])
+    else:
+        model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, encode_kwargs={"batch_size": 64})
+
+    worker = ReembedWorker(
+        MongoClient(os.getenv("MongoURI"))["revostate"], model,
+        debounce=args.debounce, batch_size=args.batch_size, poll_interval=args.poll_interval
+    )
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    worker.start()
+    try:
+        while not stop.wait(60):
+            logger.info("Re-embedding stats: %s", worker.stats())
+    except KeyboardInterrupt:
+        pass
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from embedding_cache import normalize_query
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """Caches chatbot answers and serves them for semantically similar queries.
+
+    A lookup embeds nothing itself: callers pass the query embedding they
+    already computed. The stored query with the highest cosine similarity is
+    returned when it clears ``threshold`` and was asked with exactly the same
+    parsed constraints (price, bedrooms, subcity, listing type): queries that
+    differ only in those embed almost identically. Entries expire after
+    ``ttl`` seconds and the least recently used entry is evicted beyond
+    ``maxsize``. Each entry records the collections its answer was built
+    from, and a change to one of them drops only those entries.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 1000, ttl: float = 3600):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # normalized query -> (created_at, unit vector, answer, constraints, collections)
+        self._entries = OrderedDict()
+        self._keys: List[str] = []
+        self._constraints: List[dict] = []
+        self._created: Optional[np.ndarray] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _rebuild(self):
+        self._keys = list(self._entries)
+        self._constraints = [entry[3] for entry in self._entries.values()]
+        self._created = np.array([entry[0] for entry in self._entries.values()])
+        self._matrix = np.stack([entry[1] for entry in self._entries.values()]) if self._entries else None
+
+    def _evict_expired(self):
+        # Called with the lock held, so an expired entry can never outscore a fresh one
+        if self._created is None or not len(self._created):
+            return
+        expired = np.flatnonzero(time.time() - self._created > self.ttl)
+        if len(expired):
+            for i in expired:
+                del self._entries[self._keys[i]]
+            self._rebuild()
+
+    def get(self, query: str, embedding: List[float], constraints: Optional[dict] = None) -> Optional[str]:
+        constraints = constraints or {}
+        with self._lock:
+            self._evict_expired()
+            if self._matrix is None:
+                self.misses += 1
+                return None
+            scores = self._matrix @ self._unit(embedding)
+            scores[np.array([c != constraints for c in self._constraints])] = -np.inf
+            best = int(np.argmax(scores))
+            key = self._keys[best]
+            answer = self._entries[key][2]
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            logger.info("Response cache hit: %r matched %r (%.3f)", query, key, scores[best])
+            return answer
+
+    def put(self, query: str, embedding: List[float], answer: str, constraints: Optional[dict] = None,
+            collections: Iterable[str] = ()):
+        with self._lock:
+            self._evict_expired()
+            self._entries[normalize_query(query)] = (
+                time.time(), self._unit(embedding), answer, constraints or {}, frozenset(collections)
+            )
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._rebuild()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rebuild()
+            self.invalidations += 1
+
+    def invalidate(self, collection_name: str = "", change: Optional[dict] = None):
+        """CollectionWatcher callback: drops the answers built from ``collection_name``."""
+        if not collection_name:
+            self.clear()
+            return
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if collection_name in entry[4]]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._rebuild()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Body, Request, Response, HTTPException, status
+from fastapi import APIRouter, Request, Response, HTTPException, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import asyncio
 import logging
-import json
-from GeminiAgent import agent,properties_collection
-from langchain_core.messages import HumanMessage
+from GeminiAgent import get_agent,properties_collection,response_cache,readiness,ping_mongo,admission,agent_config,turn_collections,REQUEST_DEADLINE_SECONDS,DEADLINE_MESSAGE
+from langchain_core.messages import HumanMessage, AIMessage
 from pydantic import BaseModel
 from typing import Any
-from tool import get_properties_by_context
+from tool import get_properties_by_context, embed_query
+from query_parser import parse_property_query
+from streaming import GraphStream, stream_text, error_detail
+from scheduler import Overloaded, DeadlineExceeded, deadline_scope
+from metrics import metrics
+from serialization import JSONResponse
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +21,7 @@ router = APIRouter()
 class QueryRequest(BaseModel):
     query: Any
     thread_id: str
+    use_cache: bool = True
 
 @router.post("/chatbot", response_description="Chatbot response", status_code=status.HTTP_200_OK)
 async def chatbot_response(request: Request, response: Response, body: QueryRequest):
@@ -29,30 +35,175 @@ async def chatbot_response(request: Request, response: Response, body: QueryRequ
         if not query:
             raise HTTPException(status_code=400, detail="Query is required")
 
-        # Run the agent with the provided query
-        result = await run_agent(query, thread_id=thread_id)
+        with deadline_scope(REQUEST_DEADLINE_SECONDS):
+            # Answer first-turn questions from the semantic cache when possible
+            use_cache = body.use_cache and request.headers.get("cache-control") != "no-cache"
+            result = await cached_answer(query, thread_id) if use_cache else None
+            response.headers["X-Response-Cache"] = "hit" if result is not None else "miss"
+            if result is None:
+                # Run the agent with the provided query, once this worker has room for it
+                async with admission.slot():
+                    result = await run_agent(query, thread_id=thread_id, use_cache=use_cache)
         
         # Return the result
         return {"response": result}
+    except Overloaded as e:
+        raise overloaded(e)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail=DEADLINE_MESSAGE)
     except Exception as e:
         logger.error("Error in chatbot_response: %s", str(e))
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-async def run_agent(query: str,thread_id:str) -> str:
+@router.post("/chatbot/stream", response_description="Chatbot response as Server-Sent Events", status_code=status.HTTP_200_OK)
+async def chatbot_stream(request: Request, body: QueryRequest):
+    """
+    Streams the chatbot response as Server-Sent Events: `tool_start` and `tool_end`
+    while tools run, `token` for each piece of the answer, then `done` with the full
+    response (or `error`).
+    """
+    query = body.query
+    thread_id = body.thread_id
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    try:
+        use_cache = body.use_cache and request.headers.get("cache-control") != "no-cache"
+        answer = await cached_answer(query, thread_id) if use_cache else None
+        if answer is not None:
+            events = stream_text(answer)
+        else:
+            # Shed load before the stream starts; the run takes a slot once it does
+            admission.check()
+            config = agent_config(thread_id)
+            first_turn = use_cache and isinstance(query, str) and await is_first_turn(config)
+
+            async def on_complete(answer, messages):
+                if first_turn:
+                    await remember_answer(query, answer, turn_collections(messages))
+
+            stream = GraphStream(
+                get_agent().graph, {"messages": [HumanMessage(content=query)]}, config,
+                on_complete=on_complete, slot=admission.slot, on_error=stream_error
+            )
+            events = scheduled(stream.events)
+        headers = {
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # disable proxy buffering
+            "X-Response-Cache": "hit" if answer is not None else "miss",
+        }
+        return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        logger.error("Error in chatbot_stream: %s", str(e))
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="The assistant is busy, please retry shortly",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def stream_error(e: Exception) -> dict:
+    """Error event payload for a streamed run that could not finish."""
+    if isinstance(e, Overloaded):
+        return {"detail": "The assistant is busy, please retry shortly", "retry_after": e.retry_after}
+    if isinstance(e, asyncio.TimeoutError):
+        return {"detail": DEADLINE_MESSAGE}
+    return error_detail(e)
+
+async def scheduled(events):
+    """Runs a stream under the request deadline; the run task inherits it."""
+    with deadline_scope(REQUEST_DEADLINE_SECONDS):
+        async for event in events():
+            yield event
+
+async def is_first_turn(config: dict) -> bool:
+    snapshot = await get_agent().graph.aget_state(config)
+    return not snapshot.values.get("messages")
+
+async def cached_answer(query: Any, thread_id: str):
+    """Returns a cached answer for a first-turn question, recording it in the thread."""
+    if not isinstance(query, str):
+        return None
+    config = {"configurable": {"thread_id": thread_id}}
+    if not await is_first_turn(config):
+        return None
+    answer = response_cache.get(query, await embed_query(query), parse_property_query(query))
+    if answer is not None:
+        # Keep the thread history consistent so follow-up questions have context
+        await get_agent().graph.aupdate_state(
+            config,
+            {"messages": [HumanMessage(content=query), AIMessage(content=answer)]},
+            as_node="llm"
+        )
+    return answer
+
+async def remember_answer(query: str, answer, collections=()):
+    """Caches the answer to a first-turn question with its constraints and source collections."""
+    if isinstance(answer, str) and answer and answer != DEADLINE_MESSAGE:
+        response_cache.put(query, await embed_query(query), answer, parse_property_query(query), collections)
+
+async def run_agent(query: str,thread_id:str, use_cache: bool = False) -> str:
     state = {
         "messages": [HumanMessage(content=query)]
     }
     try:
-        config = {"configurable": {"thread_id": thread_id}}
+        config = agent_config(thread_id)
+        first_turn = use_cache and isinstance(query, str) and await is_first_turn(config)
 
-        result = await agent.graph.ainvoke(state, config)
+        result = await get_agent().graph.ainvoke(state, config)
         last_message = result["messages"][-1].content
+        if first_turn:
+            await remember_answer(query, last_message, turn_collections(result["messages"]))
         return last_message
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error("Agent execution error: %s", str(e))
-        if "tool_results" in result and result.get("tool_results"):
-            return json.dumps(result["tool_results"], indent=2)
         return f"Sorry, an error occurred: {str(e)}"
+@router.get("/chatbot/cache", response_description="Response cache statistics", status_code=status.HTTP_200_OK)
+async def chatbot_cache_stats():
+    """
+    Returns hit-rate statistics of the semantic response cache.
+    """
+    return response_cache.stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Returns latency histograms and component stats in the Prometheus text format.
+    """
+    # Sync handler: some stats collectors query the database
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/healthz", response_description="Liveness", status_code=status.HTTP_200_OK)
+async def healthz():
+    """
+    Liveness probe: the worker's event loop is serving requests.
+    """
+    return {"status": "ok"}
+
+READY_PING_TIMEOUT_SECONDS = 2
+
+@router.get("/readyz", response_description="Readiness", status_code=status.HTTP_200_OK)
+async def readyz(response: Response):
+    """
+    Readiness probe: warm-up has finished and MongoDB answers a ping.
+    """
+    ready = readiness["ready"]
+    if ready:
+        try:
+            loop = asyncio.get_running_loop()
+            await asyncio.wait_for(loop.run_in_executor(None, ping_mongo), READY_PING_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.error("Readiness ping failed: %s", str(e))
+            ready = False
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {**readiness, "ready": ready}
+
 class PropertiesRequest(BaseModel):
     query: str
 @router.post("/properties-by-context", response_description="Get properties", status_code=status.HTTP_200_OK)
@@ -68,8 +219,9 @@ async def get_properties(request: Request, response: Response, body: PropertiesR
 
         result = await get_properties_by_context(query,properties_collection)
         
-        # Return the result
-        return {"properties": result}
+        # Returned as a response so FastAPI does not walk the documents with
+        # jsonable_encoder before orjson serializes them
+        return JSONResponse({"properties": result})
     except Exception as e:
         logger.error("Error in get_properties: %s", str(e))
         raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
@@ -0,0 +1,154 @@
+import asyncio
+import inspect
+import logging
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Monotonic time by which the current request must be answered. Set per
+# request and inherited by the graph's nodes, tool calls and Gemini calls.
+_deadline: ContextVar[Optional[float]] = ContextVar("revo_deadline", default=None)
+
+
+class Overloaded(Exception):
+    """The worker is at capacity; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded, retry after {retry_after} s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request deadline passed before the work finished."""
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Sets the request deadline ``seconds`` from now (never later than an enclosing one)."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the request deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def time_budget(limit: Optional[float] = None) -> Optional[float]:
+    """The smaller of ``limit`` and the time left; raises DeadlineExceeded when none is left."""
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if limit is None else min(limit, left)
+
+
+async def within_deadline(awaitable: Awaitable, limit: Optional[float] = None):
+    """Awaits ``awaitable`` for at most ``limit`` seconds and never past the request deadline."""
+    try:
+        budget = time_budget(limit)
+    except DeadlineExceeded:
+        if inspect.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, budget)
+    except asyncio.TimeoutError:
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        raise
+
+
+class ConcurrencyLimiter:
+    """Bounds the number of concurrent operations, with a bounded wait queue.
+
+    Up to ``max_active`` callers hold a slot at once. Further callers wait in
+    line, at most ``max_queued`` of them (None: no limit) for at most
+    ``max_wait`` seconds and never past the request deadline. A caller that
+    finds the line full, or waits too long, gets ``Overloaded`` with a
+    Retry-After estimate based on the recent time a slot is held.
+    """
+
+    def __init__(self, max_active: int, max_queued: Optional[int] = None, max_wait: Optional[float] = None):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+        self.hold_seconds = 1.0  # moving average of the time a slot is held
+        self._semaphore = asyncio.Semaphore(max_active)
+        self._loop = None
+
+    def retry_after(self) -> int:
+        """Seconds until the current line has likely been served."""
+        return max(1, min(60, math.ceil((self.waiting + 1) * self.hold_seconds / self.max_active)))
+
+    def _bind(self):
+        # Semaphores belong to one event loop; a new loop (tests, benchmarks) gets a new one
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._semaphore = asyncio.Semaphore(self.max_active)
+            self._loop = loop
+
+    def check(self):
+        """Raises Overloaded when a new caller would find the line full."""
+        self._bind()
+        if self._semaphore.locked() and self.max_queued is not None and self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        self.check()
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await within_deadline(self._semaphore.acquire(), self.max_wait)
+        except DeadlineExceeded:
+            self.timed_out += 1
+            raise
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded(self.retry_after())
+        finally:
+            self.waiting -= 1
+        acquired = time.monotonic()
+        self.wait_seconds += acquired - start
+        self.admitted += 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self.hold_seconds = 0.9 * self.hold_seconds + 0.1 * (time.monotonic() - acquired)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_active": self.max_active,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": round(self.wait_seconds / self.admitted, 4) if self.admitted else 0.0,
+            "avg_hold_seconds": round(self.hold_seconds, 4),
+        }
@@ -0,0 +1,76 @@
+"""Atlas Vector Search index definitions.
+
+Creates the indexes if missing and updates their definitions otherwise:
+
+    python search_indexes.py [--quantization int8|binary]
+
+With a quantization, Atlas indexes ``revoemb`` as int8 ("scalar") or 1-bit
+("binary") vectors, keeping the stored float vectors for rescoring (see
+AtlasBackend). Updating a definition rebuilds the index in the background;
+the old index serves queries until the new one is ready.
+"""
+import argparse
+import logging
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.operations import SearchIndexModel
+
+from query_parser import FILTER_PATHS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VECTOR_FIELD = {"type": "vector", "numDimensions": 384, "path": "revoemb", "similarity": "cosine"}
+
+# VECTOR_QUANTIZATION value -> Atlas vector field quantization
+ATLAS_QUANTIZATION = {"int8": "scalar", "binary": "binary"}
+
+
+def search_indexes(quantization: Optional[str] = None) -> dict:
+    vector_field = dict(VECTOR_FIELD)
+    if quantization:
+        vector_field["quantization"] = ATLAS_QUANTIZATION[quantization]
+    return {
+        "properties": {
+            "name": "properties_vector_index",
+            # Filter fields allow query constraints to be applied as $vectorSearch pre-filters
+            "definition": {"fields": [vector_field, *({"type": "filter", "path": path} for path in FILTER_PATHS.values())]},
+        },
+        "companies": {
+            "name": "companies_vector_index",
+            "definition": {"fields": [vector_field]},
+        },
+        "revoinformation": {
+            "name": "revoinformation_vector_index",
+            "definition": {"fields": [vector_field]},
+        },
+    }
+
+
+SEARCH_INDEXES = search_indexes(os.getenv("VECTOR_QUANTIZATION") or None)
+
+
+def ensure_search_indexes(db, indexes: dict = SEARCH_INDEXES):
+    for collection_name, index in indexes.items():
+        collection = db[collection_name]
+        existing = {i["name"] for i in collection.list_search_indexes()}
+        if index["name"] in existing:
+            collection.update_search_index(index["name"], index["definition"])
+            logger.info("Updated search index %s on %s", index["name"], collection_name)
+        else:
+            collection.create_search_index(
+                SearchIndexModel(definition=index["definition"], name=index["name"], type="vectorSearch")
+            )
+            logger.info("Created search index %s on %s", index["name"], collection_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or update the Atlas Vector Search indexes")
+    parser.add_argument("--quantization", choices=sorted(ATLAS_QUANTIZATION), default=os.getenv("VECTOR_QUANTIZATION") or None)
+    args = parser.parse_args()
+    load_dotenv()
+    ensure_search_indexes(MongoClient(os.getenv("MongoURI"))["revostate"], search_indexes(args.quantization))
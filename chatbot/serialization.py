@@ -1,5 +1,8 @@
 from bson import ObjectId
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
 from datetime import datetime
+from fastapi.responses import ORJSONResponse
+import orjson
 
 def convert_to_serializable(obj):
     if isinstance(obj, ObjectId):
@@ -10,4 +13,38 @@ def convert_to_serializable(obj):
         return {k: convert_to_serializable(v) for k, v in obj.items()}
     if isinstance(obj, list):
         return [convert_to_serializable(item) for item in obj]
-    return obj
\ No newline at end of file
+    return obj
+
+
+class ObjectIdAsString(TypeDecoder):
+    bson_type = ObjectId
+
+    def transform_bson(self, value):
+        return str(value)
+
+
+# Codec options for collections whose documents are sent to Gemini or API
+# clients: ObjectIds (at any depth) are decoded straight to strings while the
+# BSON is parsed, and datetimes stay datetimes for orjson to format. Queries
+# still encode ObjectId values as usual.
+JSON_CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([ObjectIdAsString()]))
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    # BSON values orjson does not know (ObjectIds in documents read without
+    # the codec options, Decimal128, ...) are written as strings
+    return str(obj)
+
+
+def dumps(obj) -> str:
+    """Serializes tool results and documents to a JSON string in one pass."""
+    return orjson.dumps(obj, default=_default, option=_OPTIONS).decode()
+
+
+class JSONResponse(ORJSONResponse):
+    """orjson response class that also accepts ObjectIds, Decimal128 and other BSON values."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from embedding_cache import normalize_query
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SearchCoalescer:
+    """Single-flight execution plus a short-lived result cache for searches.
+
+    Concurrent calls with the same key share one in-flight execution, and
+    finished results are reused for ``ttl`` seconds. ``invalidate`` drops a
+    collection's cached results; a search that was already running when its
+    collection changed is not cached. Results are shared between callers and
+    must not be modified. ``run`` is called on the event loop; ``invalidate``
+    may be called from watcher threads.
+    """
+
+    def __init__(self, ttl: float = 30, maxsize: int = 512):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._results = OrderedDict()  # key -> (created_at, result)
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(collection: str, index_name: str, query: str, filters: Optional[dict] = None, k: int = 10, stages: List[dict] = []) -> tuple:
+        return (
+            collection, index_name, normalize_query(query),
+            json.dumps(filters, sort_keys=True, default=str), k, json.dumps(stages, sort_keys=True, default=str)
+        )
+
+    async def run(self, key: tuple, search: Callable[[], Awaitable[Any]]):
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._execute(key, search))
+            self._inflight[key] = task
+        # Shielded so one caller's timeout does not cancel the search for the others
+        return await asyncio.shield(task)
+
+    async def _execute(self, key: tuple, search: Callable[[], Awaitable[Any]]):
+        generation = self._generations.get(key[0], 0)
+        try:
+            result = await search()
+        finally:
+            self._inflight.pop(key, None)
+        with self._lock:
+            if self.ttl > 0 and self._generations.get(key[0], 0) == generation:
+                self._results[key] = (time.monotonic(), result)
+                self._results.move_to_end(key)
+                while len(self._results) > self.maxsize:
+                    self._results.popitem(last=False)
+        return result
+
+    def invalidate(self, collection_name: str = "", change: Optional[dict] = None):
+        """CollectionWatcher callback."""
+        with self._lock:
+            names = [collection_name] if collection_name else list({key[0] for key in self._results} | set(self._generations))
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            for key in [key for key in self._results if key[0] in names]:
+                self._results.pop(key)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.coalesced + self.misses
+        return {
+            "size": len(self._results),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.coalesced) / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
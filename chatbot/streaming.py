@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+from contextlib import nullcontext
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, List, Optional
+
+from serialization import dumps
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+# Runs still finishing after their client went away
+_background_runs = set()
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+def error_detail(e: Exception) -> dict:
+    """Payload of the ``error`` event for a failed run."""
+    if isinstance(e, asyncio.TimeoutError):
+        return {"detail": "Sorry, this is taking longer than expected. Please try again in a moment."}
+    return {"detail": f"Sorry, an error occurred: {str(e)}"}
+
+
+def _text(content) -> str:
+    # Gemini chunks carry either a string or a list of content parts
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content or [])
+
+
+def _tool_input(data) -> dict:
+    # Drop the collections and caches injected by the agent
+    inputs = data.get("input") if isinstance(data, dict) else None
+    if not isinstance(inputs, dict):
+        return {}
+    return {k: v for k, v in inputs.items() if isinstance(v, (str, int, float, bool, list))}
+
+
+async def stream_text(answer: str) -> AsyncIterator[str]:
+    """SSE events for an answer that is already complete (e.g. a cache hit)."""
+    yield format_sse("token", {"text": answer})
+    yield format_sse("done", {"response": answer})
+
+
+class GraphStream:
+    """Streams one agent turn as Server-Sent Events.
+
+    The graph runs in its own task and publishes ``tool_start``, ``tool_end``,
+    ``token``, ``done`` and ``error`` events into a bounded queue. When the
+    client reads slower than Gemini produces tokens, tokens are coalesced
+    into larger chunks instead of blocking the run. If the client
+    disconnects, the run still finishes in the background, so the
+    checkpoint records the complete turn and never ends on an unanswered
+    tool call. The run is bounded by the request deadline it inherits, which
+    the graph's nodes turn into a final answer rather than cancelling it
+    mid-turn. The run task holds ``slot()`` (e.g. an admission slot) from
+    start to finish, including after a disconnect, and a failure ends the
+    stream with an ``error`` event built by ``on_error``.
+    """
+
+    def __init__(self, graph, state: dict, config: dict,
+                 on_complete: Optional[Callable[[str, List], Awaitable[None]]] = None, maxsize: int = STREAM_QUEUE_SIZE,
+                 slot: Callable[[], AsyncContextManager] = nullcontext,
+                 on_error: Callable[[Exception], dict] = error_detail):
+        self.graph = graph
+        self.state = state
+        self.config = config
+        self.on_complete = on_complete
+        self.slot = slot
+        self.on_error = on_error
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tokens = ""
+        self._detached = False
+
+    def _push_token(self, text: str):
+        self._tokens += text
+        try:
+            self.queue.put_nowait(("token", {"text": self._tokens}))
+            self._tokens = ""
+        except asyncio.QueueFull:
+            pass
+
+    async def _put(self, event: Optional[tuple]):
+        if self._detached:
+            return
+        if self._tokens:
+            pending, self._tokens = self._tokens, ""
+            await self.queue.put(("token", {"text": pending}))
+        await self.queue.put(event)
+
+    async def _run(self):
+        async for event in self.graph.astream_events(self.state, self.config, version="v2"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                text = _text(event["data"]["chunk"].content)
+                if text and not self._detached:
+                    self._push_token(text)
+            elif kind == "on_tool_start":
+                await self._put(("tool_start", {"name": event["name"], "input": _tool_input(event["data"])}))
+            elif kind == "on_tool_end":
+                await self._put(("tool_end", {"name": event["name"]}))
+        snapshot = await self.graph.aget_state(self.config)
+        messages = snapshot.values["messages"]
+        answer = messages[-1].content
+        if self.on_complete is not None:
+            await self.on_complete(answer, messages)
+        await self._put(("done", {"response": answer}))
+
+    async def _produce(self):
+        try:
+            async with self.slot():
+                await self._run()
+        except Exception as e:
+            logger.error("Agent streaming error: %s", str(e) or type(e).__name__)
+            await self._put(("error", self.on_error(e)))
+        finally:
+            await self._put(None)
+
+    def _detach(self):
+        self._detached = True
+        # Unblock a producer waiting on a full queue
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def events(self) -> AsyncIterator[str]:
+        task = asyncio.create_task(self._produce())
+        _background_runs.add(task)
+        task.add_done_callback(_background_runs.discard)
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield format_sse(*item)
+        finally:
+            if not task.done():
+                logger.info("Client disconnected from thread %s, finishing the turn in the background",
+                            self.config.get("configurable", {}).get("thread_id"))
+            self._detach()
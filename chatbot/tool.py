@@ -164,9 +164,19 @@
 import logging
 from langchain_core.tools import tool
 from langchain_core.documents import Document
-from langchain_huggingface import HuggingFaceEmbeddings
-from serialization import convert_to_serializable
+from embedding_cache import EmbeddingCache
+from embedding_service import EmbeddingClient
+from embedding_backend import create_embeddings
+from projections import project_stages, compact_metadata
+from query_parser import parse_property_query, build_filter, relaxations
+from geo import GEO_FIELD, SUBCITY_CENTROIDS, distance_km, find_anchor, ring_label, split_distance, subcity_rings
+from vector_backend import create_vector_backend
+from single_flight import SearchCoalescer
+from metrics import metrics
 from typing import List
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -175,35 +185,94 @@ logger = logging.getLogger(__name__)
 import os
 os.environ["HF_HOME"] = "/app/.cache"
 
-# Initialize embeddings
-embedmodel = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# Embeddings: use the shared embedding service when one is configured (see
+# gunicorn.conf.py), otherwise load the model in-process, with PyTorch or as
+# int8 ONNX (EMBEDDING_BACKEND=onnx, see embedding_backend.py). The model is loaded
+# on first use (or by the startup warm-up), not at import, unless gunicorn
+# preloads it in the master so that workers share it copy-on-write.
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/app/.cache/minilm-onnx-int8")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0")) or None  # onnxruntime default: one per core
+embedmodel = None
+_embedmodel_lock = threading.Lock()
+
+def get_embedmodel():
+    global embedmodel
+    if embedmodel is None:
+        with _embedmodel_lock:
+            if embedmodel is None:
+                if EMBEDDING_SOCKET:
+                    embedmodel = EmbeddingClient(EMBEDDING_SOCKET)
+                else:
+                    embedmodel = create_embeddings(EMBEDDING_BACKEND, onnx_dir=ONNX_MODEL_DIR, threads=ONNX_THREADS)
+    return embedmodel
+
+# Query embedding cache shared by all tools. The backend is part of the key
+# so a persisted cache is not reused across PyTorch and int8 ONNX vectors.
+embedding_cache = EmbeddingCache(
+    maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400")),
+    path=os.getenv("EMBEDDING_CACHE_PATH"),
+    model_name=f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+)
+
+# Bounded thread pools so blocking work never runs on the event loop:
+# CPU-bound query encoding and blocking pymongo calls get separate pools.
+embed_executor = ThreadPoolExecutor(max_workers=int(os.getenv("EMBED_THREADS", "2")), thread_name_prefix="embed")
+mongo_executor = ThreadPoolExecutor(max_workers=int(os.getenv("MONGO_THREADS", "8")), thread_name_prefix="mongo")
+
+@metrics.timed("embed_query")
+async def embed_query(query: str) -> List[float]:
+    cached = embedding_cache.get(query)
+    if cached is not None:
+        return cached
+    loop = asyncio.get_running_loop()
+    model = embedmodel or await loop.run_in_executor(embed_executor, get_embedmodel)
+    if isinstance(model, EmbeddingClient):
+        embedding = await model.aembed_query(query)
+    else:
+        embedding = await loop.run_in_executor(embed_executor, model.embed_query, query)
+    embedding_cache.put(query, embedding)
+    return embedding
+
+# Vector search backend: Atlas $vectorSearch, or a local ANN index over
+# exported vectors for running without Atlas (see vector_backend.py)
+vector_backend = create_vector_backend(
+    os.getenv("VECTOR_BACKEND", "atlas"),
+    index_dir=os.getenv("VECTOR_INDEX_DIR", "/app/.cache/vector_index"),
+    nprobe=int(os.getenv("VECTOR_NPROBE", "16")),
+    # int8|binary: score candidates on quantized vectors, rescore with the floats
+    quantization=os.getenv("VECTOR_QUANTIZATION") or None,
+    oversample=int(os.getenv("VECTOR_OVERSAMPLE", "0")) or None
+)
+
+@metrics.timed("vector_search")
+async def vector_search(collection, index_name: str, query_vector: List[float], k: int, num_candidates: int, filters: dict = None, stages: List[dict] = []) -> List[dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        mongo_executor, vector_backend.search, collection, index_name, query_vector, k, num_candidates, filters, stages
+    )
+
+# Identical concurrent searches share one execution; results are reused for
+# a few seconds and dropped when the collection changes (see GeminiAgent.py)
+search_coalescer = SearchCoalescer(
+    ttl=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "30")),
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+)
+
+async def coalesced_search(collection, index_name: str, query: str, k: int, num_candidates: int, filters: dict = None, stages: List[dict] = []) -> List[dict]:
+    async def search():
+        query_embedding = await embed_query(query)
+        return await vector_search(collection, index_name, query_embedding, k, num_candidates, filters=filters, stages=stages)
+    key = search_coalescer.key(collection.name, index_name, query, filters=filters, k=k, stages=stages)
+    return await search_coalescer.run(key, search)
 
 # Raw vector search function
-def raw_vector_search(collection, query: str, index_name: str, exclude_fields: List[str] = [], k: int = 10) -> List[Document]:
+async def raw_vector_search(collection, query: str, index_name: str, projection: List[dict] = [], k: int = 10, filters: dict = None) -> List[Document]:
     try:
-        query_embedding = embedmodel.embed_query(query)
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": index_name,
-                    "path": "revoemb",
-                    "queryVector": query_embedding,
-                    "numCandidates": k * 10,
-                    "limit": k
-                }
-            },
-            {
-                "$addFields": {
-                    "score": {"$meta": "vectorSearchScore"}
-                }
-            },
-            {
-                "$project": {
-                    **{field: 0 for field in exclude_fields},
-                }
-            }
-        ]
-        results = list(collection.aggregate(pipeline))
+        results = await coalesced_search(collection, index_name, query, k, k * 10, filters=filters, stages=projection)
         return [
             Document(
                 page_content=r.get("description", ""),
@@ -217,15 +286,17 @@ def raw_vector_search(collection, query: str, index_name: str, exclude_fields: L
         return []
 # Define tools
 @tool
-def properties_vector_search(query: str, properties_collection=None) -> List[dict]:
+async def properties_vector_search(query: str, detail: bool = False, properties_collection=None) -> List[dict]:
     """Search for real estate properties in Addis Ababa, Ethiopia, based on a user query.
     
     This tool searches a collection of properties including homes, apartments, villas, condos, and more.
-    It returns detailed information such as title, price, location (with subcity/district and coordinates if available),
-    specifications (bedrooms, bathrooms, area, built year), amenities, and descriptions.
+    It returns key information such as title, price, location (with subcity/district and coordinates if available),
+    specifications (bedrooms, bathrooms, area, built year), amenities, and a shortened description.
     
     Args:
         query (str): The user's search query (e.g., "apartments in Bole" or "villas with 3 bedrooms").
+        detail (bool): Set to True only when the user asks for full details of properties; returns every
+            available field and a longer description (defaults to False).
         properties_collection: The database collection containing property data (defaults to None).
     
     Returns:
@@ -233,6 +304,8 @@ def properties_vector_search(query: str, properties_collection=None) -> List[dic
             - content (str): The property description.
             - metadata (dict): Property details (e.g., price, location, bedrooms).
             - score (float): Relevance score of the match.
+            - match (str): Present when the query had price, bedroom, subcity or listing type constraints;
+              "exact" or how the constraints were relaxed to find results (e.g. "price widened by 25%").
     
     Raises:
         ValueError: If properties_collection is not provided.
@@ -241,22 +314,149 @@ def properties_vector_search(query: str, properties_collection=None) -> List[dic
     try:
         if properties_collection is None:
             raise ValueError("Properties collection not provided")
-        results = raw_vector_search(properties_collection, query, "properties_vector_index",exclude_fields=["images", "panoramicImages","revoemb"])
-        logger.info("Properties query: %s, results: %d", query, len(results),results)
-        return [
-            {
-                "content": r.page_content,
-                "metadata": convert_to_serializable(r.metadata),
-                "score": r.metadata.get("score", 0)
-            }
-            for r in results
-        ]
+        # Apply price/bedroom/subcity/listing type constraints as pre-filters,
+        # relaxing them step by step when nothing matches
+        constraints = parse_property_query(query)
+        for match, relaxed in relaxations(constraints):
+            filters = build_filter(relaxed)
+            results = await raw_vector_search(properties_collection, query, "properties_vector_index", projection=project_stages("properties", detail), filters=filters)
+            if results:
+                break
+        logger.info("Properties query: %s, filters: %s (%s), results: %d", query, filters, match, len(results))
+        with metrics.timer("serialize"):
+            return [
+                {
+                    "content": r.page_content,
+                    "metadata": compact_metadata(r.metadata),
+                    "score": r.metadata.get("score", 0),
+                    **({"match": match} if constraints else {})
+                }
+                for r in results
+            ]
     except Exception as e:
         logger.error("Properties search error: %s", str(e))
         return []
 
+# Distance from the search point, added to nearby results instead of a vector score
+GEO_DISTANCE = {"distance_km": {"$round": [{"$divide": ["$distance", 1000]}, 2]}}
+HOP_LABELS = ["in {city}", "in {city}, next to {subcity}", "in {city}, two subcities from {subcity}"]
+SUBCITY_NAMES = {s.lower(): s for s in SUBCITY_CENTROIDS}
+NEARBY_RESULTS = 10
+
+async def geo_near(properties_collection, point, max_km: float, filters: dict = None, detail: bool = False, k: int = 10) -> List[dict]:
+    geo_near_stage = {
+        "near": {"type": "Point", "coordinates": list(point)},
+        "key": GEO_FIELD,
+        "distanceField": "distance",
+        "maxDistance": max_km * 1000,
+        "spherical": True,
+    }
+    if filters:
+        geo_near_stage["query"] = filters
+    pipeline = [{"$geoNear": geo_near_stage}, {"$limit": k}, *project_stages("properties", detail, computed=GEO_DISTANCE)]
+    loop = asyncio.get_running_loop()
+    with metrics.timer("geo_near"):
+        return await loop.run_in_executor(mongo_executor, lambda: list(properties_collection.aggregate(pipeline)))
+
 @tool
-def companies_vector_search(query: str, companies_collection=None) -> List[dict]:
+async def nearby_properties_search(query: str, location: str = "", max_km: float = 8.0, detail: bool = False, properties_collection=None) -> List[dict]:
+    """Search for properties near a place in Addis Ababa, widening the area step by step in one call.
+
+    Use this when the user asks for properties near a landmark or neighbourhood (e.g., "near CMC",
+    "close to Kazanchis"), or when `properties_vector_search` found nothing in the requested subcity
+    and nearby areas should be suggested. Results are ordered from nearest to farthest; listings
+    without coordinates come from the subcity itself and its neighbouring subcities, ordered by the
+    distance to their subcity. Constraints are relaxed step by step when nothing matches.
+
+    Args:
+        query (str): The user's search query, with any price, bedroom or listing type constraints
+            (e.g., "3 bedroom house for rent under 60k near CMC").
+        location (str): The subcity or landmark to search around (e.g., "Bole", "CMC"); taken from the
+            query when empty.
+        max_km (float): Largest distance from the place to consider, in kilometres (defaults to 8; a
+            distance in the query, e.g. "within 2 km", takes precedence).
+        detail (bool): Set to True only when the user asks for full details of properties (defaults to False).
+        properties_collection: The database collection containing property data (defaults to None).
+
+    Returns:
+        List[dict]: A list of dictionaries, nearest first, each containing:
+            - content (str): The property description.
+            - metadata (dict): Property details (e.g., price, address, bedrooms).
+            - area (str): Where the property is relative to the place (e.g., "within 3 km of CMC" or
+              "in Yeka, next to Bole").
+            - distance_km (float): Distance from the place, when the property has coordinates.
+            - match (str): Present when the query had price, bedroom or listing type constraints;
+              "exact" or how the constraints were relaxed to find results.
+    """
+    try:
+        if properties_collection is None:
+            raise ValueError("Properties collection not provided")
+        anchor = find_anchor(f"{location} {query}" if location else query)
+        if anchor is None:
+            logger.info("Nearby query without a known place: %s", query)
+            return []
+        place, point, subcity = anchor
+        # "within 2 km" sets the radius and must not become a price filter
+        search_query, distance = split_distance(query)
+        max_km = distance or max_km
+        constraints = parse_property_query(search_query)
+        constraints.pop("subcity", None)
+        rings = subcity_rings(subcity)
+        hops = {s: hop for hop, ring in enumerate(rings) for s in ring}
+
+        for match, relaxed in relaxations(constraints):
+            filters = build_filter(relaxed)
+            # Listings with coordinates by distance ($geoNear), and listings
+            # without them from the subcity and each ring of subcities around it
+            ring_filters = [{"address.city": {"$in": [name for s in ring for name in (s, s.lower())]}} for ring in rings]
+            geo_hits, *ring_hits = await asyncio.gather(
+                geo_near(properties_collection, point, max_km, filters=filters, detail=detail),
+                *(raw_vector_search(
+                    properties_collection, search_query, "properties_vector_index", projection=project_stages("properties", detail),
+                    filters={"$and": [filters, ring_filter]} if filters else ring_filter
+                ) for ring_filter in ring_filters),
+                return_exceptions=True
+            )
+            if isinstance(geo_hits, Exception):
+                logger.error("Geo search error (is the 2dsphere index missing?): %s", str(geo_hits))
+                geo_hits = []
+            results = [
+                (hit["distance_km"], {
+                    "content": hit.get("description", ""),
+                    "metadata": compact_metadata({k: v for k, v in hit.items() if k not in ("description", "distance_km")}),
+                    "area": f"{ring_label(hit['distance_km'] * 1000)} of {place}",
+                    "distance_km": hit["distance_km"],
+                })
+                for hit in geo_hits
+            ]
+            for r in (r for hits in ring_hits if not isinstance(hits, Exception) for r in hits):
+                address = r.metadata.get("address") or {}
+                city = SUBCITY_NAMES.get(str(address.get("city", "")).lower())
+                # Geocoded listings are found (or ruled out by distance) by $geoNear
+                if address.get("geoPoint") or city is None:
+                    continue
+                results.append((distance_km(point, SUBCITY_CENTROIDS[city]), {
+                    "content": r.page_content,
+                    "metadata": compact_metadata(r.metadata),
+                    "area": HOP_LABELS[hops[city]].format(city=city, subcity=subcity),
+                }))
+            if results:
+                break
+        # Nearest first; listings without coordinates by their subcity's centre
+        results.sort(key=lambda result: result[0])
+        logger.info("Nearby query: %s, around %s within %.1f km, filters: %s (%s), results: %d",
+                    query, place, max_km, filters, match, len(results))
+        with metrics.timer("serialize"):
+            return [
+                {**result, **({"match": match} if constraints else {})}
+                for _, result in results[:NEARBY_RESULTS]
+            ]
+    except Exception as e:
+        logger.error("Nearby properties search error: %s", str(e))
+        return []
+
+@tool
+async def companies_vector_search(query: str, detail: bool = False, companies_collection=None) -> List[dict]:
     """Search for real estate companies in Addis Ababa, Ethiopia, based on a user query.
     
     This tool retrieves information about real estate agencies or companies, including their name,
@@ -265,6 +465,8 @@ def companies_vector_search(query: str, companies_collection=None) -> List[dict]
     
     Args:
         query (str): The user's search query (e.g., "real estate companies in Addis" or "ABC Realty details").
+        detail (bool): Set to True only when the user asks for full company details; returns every
+            available field and a longer description (defaults to False).
         companies_collection: The database collection containing company data (defaults to None).
     
     Returns:
@@ -280,22 +482,57 @@ def companies_vector_search(query: str, companies_collection=None) -> List[dict]
     try:
         if companies_collection is None:
             raise ValueError("Companies collection not provided")
-        results = raw_vector_search(companies_collection, query, "companies_vector_index",exclude_fields=["revoemb","documentUrl","imageUrl"])
-        logger.info("Companies query: %s, results: %d", query, len(results),results)
-        return [
-            {
-                "content": r.page_content,
-                "metadata": convert_to_serializable(r.metadata),
-                "score": r.metadata.get("score", 0)
-            }
-            for r in results
-        ]
+        results = await raw_vector_search(companies_collection, query, "companies_vector_index", projection=project_stages("companies", detail))
+        logger.info("Companies query: %s, results: %d", query, len(results))
+        with metrics.timer("serialize"):
+            return [
+                {
+                    "content": r.page_content,
+                    "metadata": compact_metadata(r.metadata),
+                    "score": r.metadata.get("score", 0)
+                }
+                for r in results
+            ]
     except Exception as e:
         logger.error("Companies search error: %s", str(e))
         return []
 
 @tool
-def revoestate_information(query: str, revoestate_collection=None) -> List[dict]:
+async def company_by_id(company_ids: List[str], company_cache=None) -> List[dict]:
+    """Look up real estate companies by their exact id.
+
+    Use this to find the company behind one or more properties: pass the `companyId` values from
+    `properties_vector_search` results (several ids at once when several properties are involved).
+    This is an exact lookup and much faster than `companies_vector_search`.
+
+    Args:
+        company_ids (List[str]): Company ids, e.g. ["680549dcf56fe14e4891cbb1"].
+        company_cache: The in-process company cache (defaults to None).
+
+    Returns:
+        List[dict]: One dictionary per id, in the order given, containing:
+            - companyId (str): The requested id.
+            - company (dict | None): Company details (name, contact info, address), or None if not found.
+
+    Raises:
+        ValueError: If company_cache is not provided.
+    """
+    try:
+        if company_cache is None:
+            raise ValueError("Company cache not provided")
+        company_ids = [str(i) for i in company_ids]
+        found, missing = company_cache.peek(company_ids)
+        if missing or company_cache.stale:
+            loop = asyncio.get_running_loop()
+            found = await loop.run_in_executor(mongo_executor, company_cache.get_many, company_ids)
+        logger.info("Company lookup: %d ids, found: %d", len(company_ids), len(found))
+        return [{"companyId": i, "company": found.get(i)} for i in company_ids]
+    except Exception as e:
+        logger.error("Company lookup error: %s", str(e))
+        return []
+
+@tool
+async def revoestate_information(query: str, revoestate_collection=None, revo_index=None) -> List[dict]:
     """Search for information about the Revoestate platform based on a user query.
 
     This tool provides details about Revoestate, including its mission, services (e.g., property listings,
@@ -307,6 +544,8 @@ def revoestate_information(query: str, revoestate_collection=None) -> List[dict]
         query (str): The user's query about Revoestate (e.g., "What is Revoestate?" or "How to list a property or who are founders of this platform").
         revoestate_collection: The database collection containing Revoestate data. This parameter is required
             for the search to execute.
+        revo_index: Optional in-memory index of the same collection; when given, the search runs
+            locally instead of through Atlas.
 
     **Returns:**
         List[dict]: A list of dictionaries, each containing:
@@ -324,19 +563,23 @@ def revoestate_information(query: str, revoestate_collection=None) -> List[dict]
     try:
         if revoestate_collection is None:
             raise ValueError("Revoestate collection not provided")
-        query_embedding = embedmodel.embed_query(query)
+        query_embedding = await embed_query(query)
+
+        # Serve from the in-memory copy of the small revoinformation corpus;
+        # an empty or failed load falls through to Atlas
+        if revo_index is not None:
+            if revo_index.stale:
+                loop = asyncio.get_running_loop()
+                try:
+                    await loop.run_in_executor(mongo_executor, revo_index.refresh)
+                except Exception as e:
+                    logger.error("Revoestate index refresh error: %s", str(e))
+            if revo_index.loaded:
+                return revo_index.search(query_embedding, k=5)
+
         index_name = "revoinformation_vector_index"
 
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": index_name,
-                    "queryVector": query_embedding,
-                    "path": "revoemb",
-                    "limit": 5,
-                    "numCandidates": 100
-                }
-            },
+        stages = [
             {
                 "$project": {
                     "_id": 0,  # Explicitly exclude _id
@@ -346,8 +589,7 @@ def revoestate_information(query: str, revoestate_collection=None) -> List[dict]
             }
         ]
 
-        results = revoestate_collection.aggregate(pipeline)
-        return list(results)
+        return await vector_search(revoestate_collection, index_name, query_embedding, 5, 100, stages=stages)
     except Exception as e:
         logger.error("Revoestate search error: %s", str(e))
         return []
@@ -357,17 +599,7 @@ async def get_properties_by_context(query: str, properties_collection=None) -> L
     try:
         if properties_collection is None:
             raise ValueError("Properties collection not provided")
-        query_embedding = embedmodel.embed_query(query)
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "properties_vector_index",
-                    "path": "revoemb",
-                    "queryVector": query_embedding,
-                    "numCandidates": 100,
-                    "limit": 6
-                }
-            },
+        stages = [
             {
                 "$project": {
                     # "_id": 0,  # Explicitly exclude _id
@@ -377,25 +609,17 @@ async def get_properties_by_context(query: str, properties_collection=None) -> L
                     # "companyId": 1,
                     # "userId": 1,
                     # "purchaseId": 1
-                    "revoemb": 0,  
+                    "revoemb": 0,
+                    "revoemb_hash": 0,
                     "score": {"$meta": "vectorSearchScore"}
 
                 }
             }
         ]
-        results = list(properties_collection.aggregate(pipeline))
-        
-        # Convert ObjectId fields to strings
-        for result in results:
-            if '_id' in result:
-                result['_id'] = str(result['_id'])
-            if 'companyId' in result:
-                result['companyId'] = str(result['companyId'])
-            if 'userId' in result:
-                result['userId'] = str(result['userId'])
-            if 'purchaseId' in result:
-                result['purchaseId'] = str(result['purchaseId'])
-        
+        # ObjectIds already arrive as strings (the collection's codec options),
+        # so the shared coalesced results are returned as they are
+        results = await coalesced_search(properties_collection, "properties_vector_index", query, 6, 100, stages=stages)
+
         logger.info("Properties by context query: %s, results: %d", query, len(results))
         return results
     except Exception as e:
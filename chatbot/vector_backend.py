@@ -0,0 +1,393 @@
+"""Vector search backends behind raw_vector_search.
+
+``atlas`` runs ``$vectorSearch`` on MongoDB Atlas. ``local`` answers the same
+queries from exported vector files with a NumPy IVF index and reads the
+documents from any MongoDB (no Atlas Search needed), so the service can be
+developed, load-tested and run in CI without a live cluster. Select with
+VECTOR_BACKEND=atlas|local.
+
+Export the vector files for the local backend with
+
+    python vector_backend.py export --dir /app/.cache/vector_index [--float16] [--quantize int8|binary]
+
+With VECTOR_QUANTIZATION=int8|binary, candidates are scored on compact
+quantized vectors (int8 codes or packed sign bits for the local backend, a
+scalar- or binary-quantized index on Atlas), then the best
+``VECTOR_OVERSAMPLE`` times as many as needed (default 4 for int8, 20 for
+binary) are rescored against the float vectors. int8 is the safe choice:
+sign bits separate close neighbours far more coarsely, so binary recall
+depends on how clustered the data is and should be checked with
+benchmarks/bench_vector_backend.py (raise VECTOR_OVERSAMPLE if it falls
+short) before it is enabled. Switch an existing deployment (Atlas index
+definitions and local files) with
+
+    python vector_backend.py migrate --quantization int8|binary
+"""
+import argparse
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCORE_META = {"$meta": "vectorSearchScore"}
+
+# Index name -> collection name, as created by search_indexes.py
+INDEX_COLLECTIONS = {
+    "properties_vector_index": "properties",
+    "companies_vector_index": "companies",
+    "revoinformation_vector_index": "revoinformation",
+}
+
+
+# Quantized vector formats, see QuantizedVectors
+QUANTIZATIONS = ("int8", "binary")
+# Candidates rescored per result by default: 384 sign bits rank neighbours
+# much more coarsely than int8 codes. On the clustered synthetic catalog of
+# bench_vector_backend.py, recall@10 after rescoring is 1.00 (int8, 4x) and
+# 0.97 (binary, 20x); binary without rescoring reaches only 0.18.
+DEFAULT_OVERSAMPLE = {"int8": 4, "binary": 20}
+
+
+def _exact_score(query: np.ndarray) -> dict:
+    """Atlas' cosine score against the stored (unit-length) float revoemb, as an aggregation expression."""
+    dot = {"$sum": {"$map": {
+        "input": {"$zip": {"inputs": ["$revoemb", query.tolist()]}},
+        "in": {"$multiply": [{"$arrayElemAt": ["$$this", 0]}, {"$arrayElemAt": ["$$this", 1]}]},
+    }}}
+    return {"$add": [0.5, {"$multiply": [0.5, dot]}]}
+
+
+class AtlasBackend:
+    """Atlas Vector Search ($vectorSearch).
+
+    With a quantized index (see search_indexes.py), $vectorSearch returns
+    ``oversample`` times ``k`` results ranked on the quantized vectors; they
+    are rescored with the exact cosine of the stored float ``revoemb`` and the
+    best ``k`` kept.
+    """
+
+    def __init__(self, quantization: Optional[str] = None, oversample: Optional[int] = None):
+        self.quantization = quantization
+        self.oversample = oversample or DEFAULT_OVERSAMPLE.get(quantization, 1)
+
+    def search(self, collection, index_name: str, query_vector: List[float], k: int, num_candidates: int,
+               filters: Optional[dict] = None, stages: List[dict] = []) -> List[dict]:
+        limit = k * self.oversample if self.quantization else k
+        vector_search = {
+            "index": index_name,
+            "path": "revoemb",
+            "queryVector": query_vector,
+            "numCandidates": max(num_candidates, limit),
+            "limit": limit
+        }
+        if filters:
+            vector_search["filter"] = filters
+        if not self.quantization:
+            return list(collection.aggregate([{"$vectorSearch": vector_search}, *stages]))
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        pipeline = [
+            {"$vectorSearch": vector_search},
+            {"$set": {"__score": _exact_score(query)}},
+            {"$sort": {"__score": -1}},
+            {"$limit": k},
+            *_local_stages(stages),
+            {"$project": {"__score": 0}},
+        ]
+        return list(collection.aggregate(pipeline))
+
+
+class QuantizedVectors:
+    """Compact copy of L2-normalized vectors for scoring candidates.
+
+    ``int8`` stores each component times 127 (unit vectors have components
+    in [-1, 1]), a quarter of float32. ``binary`` stores the signs packed 8
+    per byte, 1/32 of float32, and estimates the cosine from the Hamming
+    distance. Scores only rank candidates; exact similarities come from
+    ``rescore`` against the float vectors.
+    """
+
+    chunk_size = 16384  # rows scored at a time, bounding temporary memory
+
+    def __init__(self, codes: np.ndarray, kind: str):
+        self.codes = codes
+        self.kind = kind
+        self.dimensions = codes.shape[1] * 8 if kind == "binary" else codes.shape[1]
+
+    @classmethod
+    def quantize(cls, vectors: np.ndarray, kind: str) -> "QuantizedVectors":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if kind == "int8":
+            return cls(np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8), kind)
+        if kind == "binary":
+            return cls(np.packbits(vectors > 0, axis=1), kind)
+        raise ValueError(f"Unknown quantization: {kind}")
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.kind == "int8":
+            return codes.astype(np.float32) @ (query / 127)
+        distance = np.bitwise_count(codes ^ np.packbits(query > 0)).sum(axis=1, dtype=np.int32)
+        return 1 - 2 * distance.astype(np.float32) / self.dimensions
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        return np.concatenate([
+            self._score(codes[start:start + self.chunk_size], query) for start in range(0, len(codes), self.chunk_size)
+        ]) if len(codes) else np.empty(0, dtype=np.float32)
+
+
+def _scores(vectors, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    if isinstance(vectors, QuantizedVectors):
+        return vectors.scores(query, rows)
+    return np.asarray(vectors if rows is None else vectors[rows], dtype=np.float32) @ query
+
+
+class IVFIndex:
+    """Inverted-file ANN index over L2-normalized vectors (cosine similarity).
+
+    Vectors are clustered with k-means into ``nlist`` lists; a query scans the
+    ``nprobe`` lists with the closest centroids and scores their members.
+    Vectors may be a read-only memory map in float32 or float16, or
+    QuantizedVectors (then scores are approximate).
+    """
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, nprobe: int = 16):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0, nprobe: int = 16) -> "IVFIndex":
+        n = len(vectors)
+        nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+        data = np.asarray(vectors, dtype=np.float32)
+        centroids = data[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assignment == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1)
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        return cls(vectors, centroids, order, offsets, nprobe=nprobe)
+
+    def search(self, query: np.ndarray, num_candidates: int):
+        """Returns (row indices, cosine similarities), best first."""
+        probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        rows.sort()  # sequential reads from the memory map
+        scores = _scores(self.vectors, query, rows)
+        top = np.argsort(-scores)[:num_candidates]
+        return rows[top], scores[top]
+
+
+def brute_force_search(vectors, query: np.ndarray, num_candidates: int):
+    scores = _scores(vectors, query)
+    num_candidates = min(num_candidates, len(scores))
+    top = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+def rescore(vectors: np.ndarray, rows: np.ndarray, query: np.ndarray, k: int):
+    """Exact cosine similarities of ``rows`` from the float vectors; returns the best ``k``, best first."""
+    rows = np.sort(rows)  # sequential reads from the memory map
+    scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+    top = np.argsort(-scores)[:k]
+    return rows[top], scores[top]
+
+
+def _replace_score(value, replacement):
+    if value == SCORE_META:
+        return replacement
+    if isinstance(value, dict):
+        return {k: _replace_score(v, replacement) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_score(v, replacement) for v in value]
+    return value
+
+
+def _local_stages(stages: List[dict]) -> List[dict]:
+    """Rewrites post-$vectorSearch stages to read the score from ``__score``."""
+    rewritten = []
+    for stage in _replace_score(stages, "$__score"):
+        project = stage.get("$project") or {}
+        excluded = {k: v for k, v in project.items() if k != "_id" and v in (0, False)}
+        computed = {k: v for k, v in project.items() if k != "_id" and k not in excluded}
+        if excluded and computed:
+            # Exclusions cannot be mixed with computed fields outside $vectorSearch
+            rewritten.append({"$set": computed})
+            rewritten.append({"$project": {k: v for k, v in project.items() if k not in computed}})
+        else:
+            rewritten.append(stage)
+    return rewritten
+
+
+def _document_id(value: str):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+class LocalBackend:
+    """Local ANN search over exported vectors; documents come from MongoDB.
+
+    ``numCandidates`` nearest vectors are retrieved from the index, the Atlas
+    filter is applied to them as a query (Atlas filter syntax is plain MQL),
+    and the best ``k`` go through the same projection stages. With a
+    ``quantization``, the index scores the quantized vectors held in memory
+    and ``oversample`` times ``numCandidates`` of them are rescored against
+    the float vectors, which stay memory-mapped and are only read for those
+    rows.
+    """
+
+    def __init__(self, index_dir: str, nprobe: int = 16, brute_force_below: int = 5000,
+                 quantization: Optional[str] = None, oversample: Optional[int] = None):
+        self.index_dir = index_dir
+        self.nprobe = nprobe
+        self.brute_force_below = brute_force_below
+        self.quantization = quantization
+        self.oversample = oversample or DEFAULT_OVERSAMPLE.get(quantization, 1)
+        self._indexes: Dict[str, tuple] = {}
+
+    def _load(self, index_name: str):
+        if index_name not in self._indexes:
+            base = os.path.join(self.index_dir, index_name)
+            vectors = np.load(f"{base}.vectors.npy", mmap_mode="r")
+            ids = np.load(f"{base}.ids.npy")
+            codes = None
+            if self.quantization:
+                path = f"{base}.{self.quantization}.npy"
+                if os.path.exists(path):
+                    codes = QuantizedVectors(np.load(path), self.quantization)
+                else:
+                    logger.warning("No %s vectors for %s, searching the float vectors (run: vector_backend.py export --quantize %s)",
+                                   self.quantization, index_name, self.quantization)
+            ivf = None
+            if len(vectors) >= self.brute_force_below and os.path.exists(f"{base}.ivf.npz"):
+                with np.load(f"{base}.ivf.npz") as data:
+                    ivf = IVFIndex(vectors if codes is None else codes, data["centroids"], data["order"], data["offsets"], nprobe=self.nprobe)
+            self._indexes[index_name] = (vectors, ids, ivf, codes)
+            logger.info("Loaded local vector index %s (%d vectors, %s, %s)", index_name, len(vectors),
+                        "ivf" if ivf else "brute force", vectors.dtype if codes is None else codes.kind)
+        return self._indexes[index_name]
+
+    def search(self, collection, index_name: str, query_vector: List[float], k: int, num_candidates: int,
+               filters: Optional[dict] = None, stages: List[dict] = []) -> List[dict]:
+        vectors, ids, ivf, codes = self._load(index_name)
+        if not len(vectors):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        if codes is None:
+            rows, similarities = ivf.search(query, num_candidates) if ivf else brute_force_search(vectors, query, num_candidates)
+        else:
+            # Oversample on the quantized vectors, then rank by exact similarity
+            oversampled = num_candidates * self.oversample
+            rows, _ = ivf.search(query, oversampled) if ivf else brute_force_search(codes, query, oversampled)
+            rows, similarities = rescore(vectors, rows, query, num_candidates)
+        candidates = [_document_id(str(i)) for i in ids[rows]]
+        if filters:
+            # Compared as strings: the collection may decode ObjectIds to str
+            allowed = {str(doc["_id"]) for doc in collection.find({"$and": [{"_id": {"$in": candidates}}, filters]}, {"_id": 1})}
+            kept = [(i, s) for i, s in zip(candidates, similarities) if str(i) in allowed]
+            candidates, similarities = [i for i, _ in kept], [s for _, s in kept]
+        scores = {i: float((1 + s) / 2) for i, s in zip(candidates, similarities)}  # Atlas cosine score scale
+        top = candidates[:k]
+        if not top:
+            return []
+        score = {"$switch": {"branches": [{"case": {"$eq": ["$_id", i]}, "then": scores[i]} for i in top], "default": 0}}
+        pipeline = [
+            {"$match": {"_id": {"$in": top}}},
+            {"$addFields": {"__score": score}},
+            {"$sort": {"__score": -1}},
+            *_local_stages(stages),
+            {"$project": {"__score": 0}},
+        ]
+        return list(collection.aggregate(pipeline))
+
+
+def create_vector_backend(backend: str, index_dir: str = "/app/.cache/vector_index", nprobe: int = 16,
+                          quantization: Optional[str] = None, oversample: Optional[int] = None):
+    if quantization not in (None, *QUANTIZATIONS):
+        raise ValueError(f"Unknown quantization: {quantization}")
+    if backend == "atlas":
+        return AtlasBackend(quantization=quantization, oversample=oversample)
+    if backend == "local":
+        return LocalBackend(index_dir, nprobe=nprobe, quantization=quantization, oversample=oversample)
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+def export_index(collection, index_name: str, index_dir: str, float16: bool = False, nlist: Optional[int] = None,
+                 quantize: List[str] = ()):
+    """Writes a collection's revoemb vectors (normalized), their quantized codes and ids for LocalBackend."""
+    ids, vectors = [], []
+    for doc in collection.find({"revoemb": {"$exists": True}}, {"revoemb": 1}):
+        ids.append(str(doc["_id"]))
+        vectors.append(doc["revoemb"])
+    matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 384), dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    base = os.path.join(index_dir, index_name)
+    np.save(f"{base}.vectors.npy", matrix.astype(np.float16 if float16 else np.float32))
+    np.save(f"{base}.ids.npy", np.array(ids, dtype="U24"))
+    for kind in quantize:
+        np.save(f"{base}.{kind}.npy", QuantizedVectors.quantize(matrix, kind).codes)
+    if len(matrix):
+        ivf = IVFIndex.build(matrix, nlist=nlist)
+        np.savez(f"{base}.ivf.npz", centroids=ivf.centroids, order=ivf.order, offsets=ivf.offsets)
+    logger.info("Exported %d vectors for %s to %s%s", len(ids), index_name, base, f" ({', '.join(quantize)})" if quantize else "")
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Export vectors for the local vector search backend")
+    parser.add_argument("command", choices=["export", "migrate"],
+                        help="export: write the local index files; migrate: switch the Atlas index definitions and "
+                             "the local files to --quantization")
+    parser.add_argument("--dir", default=os.getenv("VECTOR_INDEX_DIR", "/app/.cache/vector_index"))
+    parser.add_argument("--float16", action="store_true", help="store vectors as float16 (half the size)")
+    parser.add_argument("--quantize", action="append", choices=QUANTIZATIONS, default=[],
+                        help="also write quantized vectors (repeatable)")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=os.getenv("VECTOR_QUANTIZATION") or None,
+                        help="quantization to migrate to")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MongoURI"))["revostate"]
+    quantize = list(args.quantize)
+    if args.command == "migrate":
+        from search_indexes import ensure_search_indexes, search_indexes
+
+        if not args.quantization:
+            parser.error("migrate needs --quantization (or VECTOR_QUANTIZATION)")
+        # Atlas rebuilds the indexes in the background and keeps serving the
+        # current ones; the stored float revoemb values are not changed
+        ensure_search_indexes(db, search_indexes(args.quantization))
+        quantize.append(args.quantization)
+    os.makedirs(args.dir, exist_ok=True)
+    for index_name, collection_name in INDEX_COLLECTIONS.items():
+        export_index(db[collection_name], index_name, args.dir, float16=args.float16, quantize=sorted(set(quantize)))
+    if args.command == "migrate":
+        logger.info("Migrated to %s vectors; set VECTOR_QUANTIZATION=%s once the Atlas indexes are ready",
+                    args.quantization, args.quantization)
+
+
+if __name__ == "__main__":
+    main()